@@ -1,7 +1,7 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-""" 
+"""
 Mesh Subdivision Plugin.
 
 **Project Name:**      MakeHuman
@@ -21,19 +21,537 @@ Mesh Subdivision Plugin.
 Abstract
 --------
 
-TODO
+Catmull-Clark subdivision of meshes.
+
+Each vertex of a subdivided mesh is a fixed weighted sum of a few vertices
+of the source mesh. These weights are held in a sparse stencil matrix, with
+one row per subdivided vertex and one column per source vertex, so the
+subdivided coordinates are computed with one sparse product whenever the
+source mesh changes. The stencils of several levels of subdivision are
+composed into one matrix; the uvs are subdivided the same way.
+
+The subdivision can be limited to some face groups, or given a number of
+levels per face. The faces next to more refined faces are split into
+triangles which join them without cracks.
+
+The topology of the subdivided mesh (its faces, the stencils and the render
+buffers) depends only on the topology of the source mesh. It is cached on
+disk under a hash of the source topology, so subdividing a mesh which was
+subdivided before only costs the coordinate update.
 """
 
 __docformat__ = 'restructuredtext'
 
+import os
 import time
+import hashlib
 import numpy as np
 
-from module3d import Object3D
+from module3d import Object3D, buildAdjacency, denseAdjacency, gatherAdjacency
+from getpath import getPath
+import files3d
 import log
 
+# Directory of the cached subdivision topologies, None for the default
+# (subdivision in the user cache directory)
+cacheDir = None
+cacheVersion = 3
+
+# The least recently used topologies are removed when the cache grows beyond
+# this many bytes, or see files3d.cacheMaxAge
+cacheMaxSize = 512 << 20
+
+class Stencil(object):
+
+    """
+    A sparse matrix in compressed sparse row (CSR) form, mapping the values
+    of the vertices (or uvs) of a mesh onto those of its subdivision: row i
+    of the result is the sum of weights[k] * values[indices[k]] for k in
+    indptr[i]:indptr[i+1].
+    """
+
+    # The largest number of entries expanded at once by compose
+    batchSize = 1 << 22
+
+    def __init__(self, indptr, indices, weights, shape):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.shape = tuple(shape)
+
+        # Rows without any entries are skipped by the product
+        counts = np.diff(indptr.astype(np.int64))
+        self.rows = np.argwhere(counts)[...,0]
+        self.starts = indptr[self.rows]
+
+        # The rows using each column, built when first needed
+        self.columns = None
+
+    @classmethod
+    def fromEntries(cls, rows, cols, weights, shape):
+        """
+        Builds a stencil from a list of (row, column, weight) entries. The
+        weights of repeated entries are added up.
+        """
+
+        keys = rows.astype(np.int64) * shape[1] + cols
+        keys, inverse = np.unique(keys, return_inverse=True)
+        weights = np.bincount(inverse, weights=weights, minlength=len(keys))
+        used = weights != 0
+        keys = keys[used]
+        rows = keys // shape[1]
+        indptr = np.zeros(shape[0] + 1, dtype=np.uint32)
+        np.cumsum(np.bincount(rows, minlength=shape[0]), out=indptr[1:])
+        return cls(indptr, (keys - rows * shape[1]).astype(np.uint32), weights[used].astype(np.float32), shape)
+
+    @classmethod
+    def fromArrays(cls, arrays, name):
+        """
+        Returns the stencil stored under name by getArrays.
+        """
+
+        return cls(arrays[name + 'Indptr'], arrays[name + 'Indices'],
+                   arrays[name + 'Weights'], arrays[name + 'Shape'])
+
+    def getArrays(self, name):
+        """
+        Returns the arrays of this stencil by name, to be cached.
+        """
+
+        return {
+            name + 'Indptr': self.indptr,
+            name + 'Indices': self.indices,
+            name + 'Weights': self.weights,
+            name + 'Shape': np.array(self.shape, dtype=np.int64)
+            }
+
+    def getRows(self):
+        return np.repeat(np.arange(self.shape[0], dtype=np.uint32), np.diff(self.indptr.astype(np.int64)))
+
+    def getDependents(self, cols):
+        """
+        Returns the rows which use any of the given columns, that is the
+        subdivided vertices which move when the given vertices move.
+        """
+
+        if self.columns is None:
+            indptr, entries = buildAdjacency(self.indices[:,None], self.shape[1])
+            self.columns = (indptr, self.getRows()[entries])
+        rows, counts = gatherAdjacency(self.columns[0], self.columns[1], cols)
+        return np.unique(rows)
+
+    def apply(self, values, out=None, rows=None):
+        """
+        Returns the product of this stencil and an array of values of shape
+        (columns, n). If rows is given, only these rows of out are computed.
+        """
+
+        if out is None:
+            out = np.zeros((self.shape[0],) + values.shape[1:], dtype=np.float32)
+        if rows is not None:
+            cols, counts = gatherAdjacency(self.indptr, self.indices, rows)
+            weights, counts = gatherAdjacency(self.indptr, self.weights, rows)
+            out[rows] = 0
+            used = counts > 0
+            if np.any(used):
+                weighted = values[cols] * weights[:,None]
+                out[rows[used]] = np.add.reduceat(weighted, (np.cumsum(counts) - counts)[used], axis=0)
+            return out
+        out[...] = 0
+        if len(self.indices):
+            weighted = values[self.indices] * self.weights[:,None]
+            out[self.rows] = np.add.reduceat(weighted, self.starts, axis=0)
+        return out
+
+    def compose(self, other):
+        """
+        Returns the stencil of this stencil applied to the result of other,
+        the matrix product of the two.
+        """
+
+        counts = np.diff(other.indptr.astype(np.int64))[self.indices]
+        nrows = self.shape[0]
+        step = max(1, nrows * self.batchSize // max(int(counts.sum()), 1))
+        rows = self.getRows()
+        entries = np.arange(len(other.indices), dtype=np.uint32)
+
+        # Expand the entries a number of rows at a time, to bound the size
+        # of the temporaries. The rows of the parts do not overlap, so the
+        # arrays of the parts are simply joined.
+        parts = []
+        for first in xrange(0, nrows, step):
+            start = self.indptr[first]
+            stop = self.indptr[min(first + step, nrows)]
+            expanded, n = gatherAdjacency(other.indptr, entries, self.indices[start:stop])
+            parts.append(Stencil.fromEntries(
+                np.repeat(rows[start:stop], n),
+                other.indices[expanded],
+                np.repeat(self.weights[start:stop].astype(np.float64), n) * other.weights[expanded],
+                (nrows, other.shape[1])))
+
+        indptr = np.sum([part.indptr for part in parts], axis=0).astype(np.uint32)
+        indices = np.concatenate([part.indices for part in parts])
+        weights = np.concatenate([part.weights for part in parts])
+        return Stencil(indptr, indices, weights, (nrows, other.shape[1]))
+
+def getTopologyKey(object, face_mask, levels):
+    """
+    Returns the key of the subdivision topology of an object, a hash of its
+    topology, its uv indices, the faces which are subdivided and the number
+    of levels (of all faces, or of each face).
+    """
+
+    md5 = hashlib.md5()
+    md5.update('%d %s %d' % (cacheVersion, object.getTopologyHash(), len(object.texco)))
+    md5.update(np.ascontiguousarray(object.fuvs, dtype=np.uint32).tostring())
+    md5.update(np.packbits(face_mask).tostring())
+    md5.update(np.asarray(levels, dtype=np.int32).tostring())
+    return md5.hexdigest()
+
+def getTopologyPath(key):
+    folder = cacheDir or os.path.join(getPath('cache'), 'subdivision')
+    return os.path.join(folder, key + '.npz')
+
+def loadTopology(key):
+    """
+    Returns a cached subdivision topology, or None if there is none.
+    """
+
+    path = getTopologyPath(key)
+    if not os.path.isfile(path):
+        return None
+    try:
+        npzfile = np.load(path)
+        try:
+            topology = dict((name, npzfile[name]) for name in npzfile.files)
+        finally:
+            npzfile.close()
+    except StandardError:
+        log.notice('unable to load subdivision topology: %s', path)
+        return None
+
+    # Mark the topology as used, so that it is not pruned
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return topology
+
+def saveTopology(key, topology):
+    path = getTopologyPath(key)
+    try:
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        np.savez(path, **topology)
+        files3d.pruneCache(folder, path, maxSize=cacheMaxSize)
+    except StandardError:
+        log.notice('unable to save subdivision topology: %s', path)
+
+def uniqueEdges(fvert):
+    """
+    Returns the distinct edges of a set of faces, numbered in order of first
+    use, with the vertices of each edge sorted. Also returns the first and
+    last face using each edge, and the edge of each side of each face (side
+    j of a face goes from its vertex j to its vertex j+1).
+    """
+
+    va = fvert.astype(np.int64)
+    vb = np.roll(va, -1, axis=1)
+    lo = np.minimum(va, vb).ravel()
+    hi = np.maximum(va, vb).ravel()
+    count = int(hi.max()) + 1 if len(hi) else 1
+    keys = lo * count + hi
+    unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    last = len(keys) - 1 - np.unique(keys[::-1], return_index=True)[1]
+
+    order = np.argsort(first)
+    rank = np.empty(len(unique), dtype=np.uint32)
+    rank[order] = np.arange(len(unique), dtype=np.uint32)
+    first = first[order]
+    last = last[order]
+
+    edges = np.empty((len(unique), 2), dtype=np.uint32)
+    edges[:,0] = lo[first]
+    edges[:,1] = hi[first]
+    faces = np.empty((len(unique), 2), dtype=np.uint32)
+    faces[:,0] = first // fvert.shape[1]
+    faces[:,1] = last // fvert.shape[1]
+    return edges, faces, rank[inverse].reshape(fvert.shape)
+
+def subdivideFaces(fvert, fuvs, group, nverts, ntexco, refine=None):
+    """
+    Subdivides a set of faces once. The faces selected by refine (all faces
+    by default) are split into four quads. The faces sharing an edge with
+    them are split into triangles around their centre, through the new
+    points on those edges, so there are no cracks between the refined and
+    the unrefined faces. The other faces are kept as they are.
+
+    Returns the faces of the subdivision (their vertices, uvs and groups),
+    the face each of them comes from, and the stencils of the vertices and
+    uvs of the subdivision.
+
+    Parameters
+    ----------
+
+    fvert:
+        *array*. The vertex indices of the faces, of shape (faces, 4).
+
+    fuvs:
+        *array*. The uv indices of the faces.
+
+    group:
+        *array*. The face group of each face.
+
+    nverts:
+        *int*. The number of vertices the faces index into.
+
+    ntexco:
+        *int*. The number of uvs the faces index into.
+
+    refine:
+        *array*. Optional: a boolean mask of the faces to refine.
+    """
+
+    nfaces = len(fvert)
+    if refine is None:
+        refine = np.ones(nfaces, dtype=bool)
+
+    # Only the vertices and uvs used by the faces are kept, in order
+    vert_mask = np.zeros(nverts, dtype = bool)
+    vert_mask[fvert] = True
+    vtx_map = np.argwhere(vert_mask)[...,0]
+    vtx_rmap = np.zeros(nverts, dtype=int) - 1
+    vtx_rmap[vtx_map] = np.arange(len(vtx_map))
+
+    uv_mask = np.zeros(ntexco, dtype = bool)
+    uv_mask[fuvs] = True
+    uv_map = np.argwhere(uv_mask)[...,0]
+    uv_rmap = np.zeros(ntexco, dtype=int) - 1
+    uv_rmap[uv_map] = np.arange(len(uv_map))
+
+    fverts = vtx_rmap[fvert]
+    fuv = uv_rmap[fuvs]
+
+    # Each edge has its two vertices and the first and last face using it,
+    # which are the same for edges on the border
+    evert, eface, fvedges = uniqueEdges(fverts)
+    etexc, _, ftedges = uniqueEdges(fuv)
+
+    # The edges of the refined faces are split, the faces next to them are
+    # split into triangles around their face point
+    split = refine[eface[:,0]] | refine[eface[:,1]]
+    fsplit = split[fvedges]
+    transition = ~refine & np.any(fsplit, axis=1)
+    centred = refine | transition
+    tsplit = np.zeros(len(etexc), dtype=bool)
+    tsplit[ftedges[fsplit]] = True
+    smooth = np.zeros(len(vtx_map), dtype=bool)
+    smooth[fverts[refine]] = True
+
+    # The subdivision has the kept vertices, followed by the face points of
+    # the centred faces and the edge points of the split edges
+    cbase = len(vtx_map)
+    ebase = cbase + np.count_nonzero(centred)
+    fpoint = np.zeros(nfaces, dtype=np.int64) - 1
+    fpoint[centred] = np.arange(cbase, ebase)
+    epoint = np.zeros(len(evert), dtype=np.int64) - 1
+    epoint[split] = np.arange(ebase, ebase + np.count_nonzero(split))
+
+    tcbase = len(uv_map)
+    tebase = tcbase + np.count_nonzero(centred)
+    tfpoint = np.zeros(nfaces, dtype=np.int64) - 1
+    tfpoint[centred] = np.arange(tcbase, tebase)
+    tepoint = np.zeros(len(etexc), dtype=np.int64) - 1
+    tepoint[tsplit] = np.arange(tebase, tebase + np.count_nonzero(tsplit))
+
+    sfvert = []
+    sfuvs = []
+    source = []
+
+    # Create faces
+    # v0  e0  v1
+    #
+    # e3  c   e1
+    #
+    # v3  e2  v2
+
+    faces = np.argwhere(refine)[...,0]
+    for corners, edges, centres, result in ((fverts, epoint[fvedges], fpoint, sfvert),
+                                            (fuv, tepoint[ftedges], tfpoint, sfuvs)):
+        quads = np.empty((len(faces),4,4), dtype=np.int64)
+        quads[:,:,0] = corners[faces]
+        quads[:,:,1] = edges[faces]
+        quads[:,:,2] = centres[faces][:,None]
+        quads[:,:,3] = np.roll(quads[:,:,1],1,axis=-1)
+        result.append(quads.reshape((-1,4)))
+    source.append(np.repeat(faces, 4))
+
+    faces = np.argwhere(~centred)[...,0]
+    sfvert.append(fverts[faces])
+    sfuvs.append(fuv[faces])
+    source.append(faces)
+
+    # The outline of a transition face runs through its corners and the
+    # points of its split edges, each side of the outline makes a triangle
+    # with the face point. The sides of repeated corners are left out.
+    faces = np.argwhere(transition)[...,0]
+    outlined = np.ones((len(faces), 8), dtype=bool)
+    outlined[:,1::2] = fsplit[faces]
+    counts = np.count_nonzero(outlined, axis=1)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    current = np.arange(len(first))
+    following = np.where(current + 1 == first + np.repeat(counts, counts), first, current + 1)
+    owner = np.repeat(faces, counts)
+    sides = None
+    for corners, edges, centres, result in ((fverts, epoint[fvedges], fpoint, sfvert),
+                                            (fuv, tepoint[ftedges], tfpoint, sfuvs)):
+        outline = np.empty((len(faces), 8), dtype=np.int64)
+        outline[:,0::2] = corners[faces]
+        outline[:,1::2] = edges[faces]
+        outline = outline[outlined]
+        if sides is None:
+            sides = outline != outline[following]
+        triangles = np.empty((np.count_nonzero(sides), 4), dtype=np.int64)
+        triangles[:,0] = outline[sides]
+        triangles[:,1] = outline[following][sides]
+        triangles[:,2:] = centres[owner[sides]][:,None]
+        result.append(triangles)
+    source.append(owner[sides])
+
+    source = np.concatenate(source)
+    order = np.argsort(source, kind='mergesort')
+    source = source[order]
+    sfvert = np.concatenate(sfvert)[order].astype(np.uint32)
+    sfuvs = np.concatenate(sfuvs)[order].astype(np.uint32)
+
+    # The stencil is first built on the kept vertices followed by the face
+    # points of all faces, then composed with the stencil of the face points
+    nv = len(vtx_map)
+    rows = []
+    cols = []
+    weights = []
+    def add(r, c, w):
+        rows.append(r)
+        cols.append(c)
+        weights.append(w)
+
+    vrows = np.arange(nv)
+    inedge = eface[:,0] == eface[:,1]
+
+    vfaceIndptr, vfaceIndices = buildAdjacency(fverts, nv)
+    fcounts = np.diff(vfaceIndptr.astype(np.int64))
+    nvface = fcounts.astype(np.float64)
+
+    vedgeIndptr, vedgeIndices = buildAdjacency(evert, nv)
+    ecounts = np.diff(vedgeIndptr.astype(np.int64))
+    nedges = ecounts.astype(np.float64)
+    erows = np.repeat(vrows, ecounts)
+    nvedge = np.bincount(erows, weights=inedge[vedgeIndices], minlength=nv)
+
+    # Vertex points: interior vertices are (F + 2E + (n-3)P) / n, with F
+    # and E the means of the face points and edge midpoints around the
+    # vertex, border vertices are the mean of P and the midpoints of the
+    # border edges around them. Vertices on fewer than 3 faces are
+    # (3E - F) / 2. Vertices which are not on a refined face do not move.
+    valid = nvface >= 3
+    interior = valid & (nedges == nvface)
+    border = valid & ~interior
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wface = np.where(interior, 1 / nvface ** 2, np.where(border, 0, -1 / (2 * nvface)))
+        wedge = np.where(interior, 1 / (nedges * nvface), np.where(border, 0.5 / (nvedge + 1), 0.75 / nedges))
+        wvert = np.where(interior, (nvface - 3) / nvface, np.where(border, 1 / (nvedge + 1), 0))
+    wface = np.where(smooth, wface, 0)
+    wedge = np.where(smooth, wedge, 0)
+    wvert = np.where(smooth, wvert, 1)
+
+    add(vrows, vrows, wvert)
+    add(np.repeat(vrows, fcounts), nv + vfaceIndices, np.repeat(wface, fcounts))
+    ewts = np.where(np.repeat(border, ecounts) & ~inedge[vedgeIndices], 0, np.repeat(wedge, ecounts))
+    add(erows, evert[vedgeIndices,0], ewts)
+    add(erows, evert[vedgeIndices,1], ewts)
+
+    # Face points
+    add(fpoint, nv + np.arange(nfaces), np.ones(nfaces))
+
+    # Edge points: the midpoint of border edges, the mean of the two
+    # vertices and the two face points of the others
+    ewts = np.where(inedge, 0.5, 0.25)
+    add(epoint, evert[:,0], ewts)
+    add(epoint, evert[:,1], ewts)
+    add(epoint, nv + eface[:,0], np.where(inedge, 0, 0.25))
+    add(epoint, nv + eface[:,1], np.where(inedge, 0, 0.25))
+
+    rows = np.concatenate(rows)
+    used = rows >= 0
+    nsub = ebase + np.count_nonzero(split)
+    stencil = Stencil.fromEntries(rows[used], np.concatenate(cols)[used], np.concatenate(weights)[used],
+                                  (nsub, nv + nfaces))
+
+    points = Stencil.fromEntries(np.concatenate((vrows, np.repeat(nv + np.arange(nfaces), 4))),
+                                 np.concatenate((vtx_map, fvert.ravel())),
+                                 np.concatenate((np.ones(nv), np.repeat(0.25, 4 * nfaces))),
+                                 (nv + nfaces, nverts))
+    stencil = stencil.compose(points)
+
+    # The uvs are the uvs of the vertices, the mean of the uvs of each face
+    # and the mean of the uvs of each edge
+    nt = len(uv_map)
+    faces = np.argwhere(centred)[...,0]
+    edges = np.argwhere(tsplit)[...,0]
+    uvStencil = Stencil.fromEntries(
+        np.concatenate((np.arange(nt), np.repeat(tfpoint[faces], 4), np.repeat(tepoint[edges], 2))),
+        np.concatenate((uv_map, fuvs[faces].ravel(), uv_map[etexc[edges].ravel()])),
+        np.concatenate((np.ones(nt), np.repeat(0.25, 4 * len(faces)), np.repeat(0.5, 2 * len(edges)))),
+        (tebase + len(edges), ntexco))
+
+    return sfvert, sfuvs, group[source].astype(np.uint32), source, stencil, uvStencil
+
+def buildTopology(object, face_mask, levels=1):
+    """
+    Builds the topology of the subdivision of the faces of an object
+    selected by face_mask: the faces of the subdivided mesh, the face of
+    the object each of them comes from and the stencils of its vertices and
+    uvs. The arrays are returned by name.
+
+    levels is the number of times the faces are subdivided, either one
+    number for all faces or an array with one number per face of the
+    object. Faces with fewer levels than their neighbours are split as
+    needed to join them without cracks.
+    """
+
+    face_map = np.argwhere(face_mask)[...,0]
+    fvert = object.fvert[face_map]
+    fuvs = object.fuvs[face_map]
+    group = object.group[face_map]
+    nverts = len(object.coord)
+    ntexco = len(object.texco)
+    levels = (np.zeros(len(object.fvert), dtype=int) + levels)[face_map]
+
+    stencil = None
+    uvStencil = None
+    for level in xrange(max(levels.max(), 1) if len(levels) else 1):
+        refine = levels > 0
+        fvert, fuvs, group, source, vs, ts = subdivideFaces(fvert, fuvs, group, nverts, ntexco, refine)
+        levels = np.where(refine[source], levels[source] - 1, 0)
+        face_map = face_map[source]
+        stencil = vs if stencil is None else vs.compose(stencil)
+        uvStencil = ts if uvStencil is None else ts.compose(uvStencil)
+        nverts = vs.shape[0]
+        ntexco = ts.shape[0]
+
+    topology = {
+        'fvert': fvert,
+        'fuvs': fuvs,
+        'group': group,
+        'origin': face_map
+        }
+    topology.update(stencil.getArrays('stencil'))
+    topology.update(uvStencil.getArrays('uvStencil'))
+    return topology
+
 class SubdivisionObject(Object3D):
-    def __init__(self, object):
+    def __init__(self, object, levels=1, groups=None):
         name = object.name + '.sub'
         super(SubdivisionObject, self).__init__(name, 4)
 
@@ -46,14 +564,18 @@ class SubdivisionObject(Object3D):
         self.texture = object.texture
         self.shadeless = object.shadeless
         self.solid = object.solid
-        self.transparentPrimitives = object.transparentPrimitives * 4
         self.object = object.object
         self.parent = object
         self.priority = object.priority
         self.cull = object.cull
 
+        # The number of levels of all faces, or of each face, and the names
+        # of the face groups to subdivide, None for all
+        self.levels = levels
+        self.groups = groups
+
     def create(self, progressCallback):
-        total = 19
+        total = 6
         now = [time.time()]
         def progress(x):
             last = now[0]
@@ -63,225 +585,95 @@ class SubdivisionObject(Object3D):
                 progressCallback(float(x)/total)
 
         progress(0)
-        
+
         parent = self.parent
-        nverts = len(parent.coord)
-        ntexco = len(parent.texco)
-        nfaces = len(parent.fvert)
 
         group_mask = np.ones(len(parent._faceGroups), dtype=bool)
+        group_levels = np.ones(len(parent._faceGroups), dtype=bool)
 
         for g in parent._faceGroups:
             fg = self.createFaceGroup(g.name)
             if ('joint' in fg.name or 'helper' in g.name):
                 group_mask[fg.idx] = False
+            if self.groups is not None and g.name not in self.groups:
+                group_levels[fg.idx] = False
+
+        face_mask = group_mask[parent.group]
+        levels = self.levels
+        if self.groups is not None:
+            levels = np.where(group_levels[parent.group], levels, 0)
+        key = getTopologyKey(parent, face_mask, levels)
+        topology = loadTopology(key)
 
         progress(1)
 
-        face_mask = group_mask[parent.group]
-        self.face_map = np.argwhere(face_mask)[...,0]
-        self.face_rmap = np.zeros(nfaces, dtype=int) - 1
-        nfaces = len(self.face_map)
-        self.face_rmap[self.face_map] = np.arange(nfaces)
+        if topology is None:
+            topology = buildTopology(parent, face_mask, levels)
+            self.setTopology(topology)
+            self._update_faces()
+            self.updateIndexBuffer()
+            topology['vfaceIndptr'] = self.vfaceIndptr
+            topology['vfaceIndices'] = self.vfaceIndices
+            topology.update(self.getIndexBuffer())
+            saveTopology(key, topology)
+        else:
+            self.setTopology(topology)
+            self.vfaceIndptr = topology['vfaceIndptr']
+            self.vfaceIndices = topology['vfaceIndices']
+            self.vface, self.nfaces = denseAdjacency(self.vfaceIndptr, self.vfaceIndices)
+            self.updateIndexBuffer(topology)
 
         progress(2)
 
-        verts = parent.fvert[face_mask]
-        vert_mask = np.zeros(nverts, dtype = bool)
-        vert_mask[verts] = True
-        self.vtx_map = np.argwhere(vert_mask)[...,0]
-        vtx_rmap = np.zeros(nverts, dtype=int) - 1
-        nverts = len(self.vtx_map)
-        vtx_rmap[self.vtx_map] = np.arange(nverts)
+        self.update_uvs()
 
         progress(3)
 
-        uvs = parent.fuvs[face_mask]
-        uv_mask = np.zeros(ntexco, dtype = bool)
-        uv_mask[uvs] = True
-        self.uv_map = np.argwhere(uv_mask)[...,0]
-        uv_rmap = np.zeros(ntexco, dtype=int) - 1
-        ntexco = len(self.uv_map)
-        uv_rmap[self.uv_map] = np.arange(ntexco)
+        self.update_coords()
 
         progress(4)
 
-        vedgelist = []
-        vedgemap = {}
-        fvert = vtx_rmap[parent.fvert[self.face_map]]
-        vedges = np.dstack((fvert,np.roll(fvert,-1,axis=1)))
-        fverts = []
-
-        tedgelist = []
-        tedgemap = {}
-        fuv = uv_rmap[parent.fuvs[self.face_map]]
-        tedges = np.dstack((fuv,np.roll(fuv,-1,axis=1)))
-        fuvs = []
-
-        groups = []
-
-        self.cbase = nverts
-        self.ebase = nverts + nfaces
-
-        self.tcbase = ntexco
-        self.tebase = ntexco + nfaces
+        self.calcNormals()
 
         progress(5)
 
-        fvedges2 = []
-        ftedges2 = []
-
-        for i, fi in enumerate(self.face_map):
-            group = parent.group[fi]
-
-            fvedges = []
-            ftedges = []
-
-            for (va,vb) in vedges[i]:
-                if va > vb:
-                    va,vb = vb,va
-                p = va,vb
-
-                vi = vedgemap.get(p)
-                if vi is None:
-                    vi = len(vedgelist)
-                    vedgelist.append((p,(i,i)))
-                    vedgemap[p] = vi
-                else:
-                    p,(j,_) = vedgelist[vi]
-                    vedgelist[vi] = (p,(j,i))
-
-                fvedges.append(vi)
-
-            for j, (ta,tb) in enumerate(tedges[i]):
-                if ta > tb:
-                    ta,tb = tb,ta
-                q = ta,tb
-
-                ti = tedgemap.get(q)
-                if ti is None:
-                    ti = len(tedgelist)
-                    tedgelist.append(q)
-                    tedgemap[q] = ti
-
-                ftedges.append(ti)
-
-            fvedges2.append(fvedges)
-            ftedges2.append(ftedges)
+        self.sync_all()
 
         progress(6)
 
-        nfaces = len(self.face_map)
-
-        self.fvert = np.empty((nfaces,4,4), dtype=np.uint32)
-        self.fuvs  = np.empty((nfaces,4,4), dtype=np.uint32)
-        self.group = np.empty((nfaces,4), dtype=np.uint32)
-
-        # Create faces
-        # v0  e0  v1
-        # 
-        # e3  c   e1
-        #
-        # v3  e2  v2
-
-        self.fvert[:,:,0] = fvert
-        self.fvert[:,:,2] = np.arange(nfaces)[:,None] + self.cbase
-
-        self.fuvs[:,:,0] = fuv
-        self.fuvs[:,:,2] = np.arange(nfaces)[:,None] + self.tcbase
-
-        self.group[...] = parent.group[self.face_map][:,None]
-
-        progress(7)
-
-        fvedges2 = np.asarray(fvedges2, dtype=np.uint32) + self.ebase
-
-        self.fvert[:,:,1] = fvedges2
-        self.fvert[:,:,3] = np.roll(fvedges2,1,axis=-1)
-
-        ftedges2 = np.asarray(ftedges2, dtype=np.uint32) + self.tebase
-
-        self.fuvs[:,:,1] = ftedges2
-        self.fuvs[:,:,3] = np.roll(ftedges2,1,axis=-1)
-
-        progress(8)
-
-        self.evert = np.asarray(vedgelist, dtype = np.uint32)
-        self.etexc = np.asarray(tedgelist, dtype = np.uint32)
-
-        self.vedge = np.zeros((nverts, self.MAX_FACES), dtype=np.uint32)
-        self.nedges = np.zeros(nverts, dtype=np.uint8)
-
-        progress(9)
-
-        for i, (vab,_) in enumerate(self.evert):
-            for v in vab:
-                self.vedge[v, self.nedges[v]] = i
-                self.nedges[v] += 1
+    def setTopology(self, topology):
+        """
+        This method sets up the faces and the stencils of this object from
+        a topology returned by buildTopology.
+        """
 
-        progress(10)
+        self.stencil = Stencil.fromArrays(topology, 'stencil')
+        self.uvStencil = Stencil.fromArrays(topology, 'uvStencil')
 
-        nverts = self.ebase + len(vedgelist)
+        nverts = self.stencil.shape[0]
 
         self.coord = np.zeros((nverts, 3), dtype=np.float32)
         self.vnorm = np.zeros((nverts, 3), dtype=np.float32)
         self.color = np.zeros((nverts, 4), dtype=np.uint8) + 255
-        self.vface = np.zeros((nverts, self.MAX_FACES), dtype=np.uint32)
-        self.nfaces = np.zeros(nverts, dtype=np.uint8)
 
         self.ucoor = False
         self.unorm = False
         self.ucolr = False
 
-        progress(11)
-
-        ntexco = self.tebase + len(tedgelist)
+        ntexco = self.uvStencil.shape[0]
 
         self.texco = np.zeros((ntexco, 2), dtype=np.float32)
 
         self.utexc = False
 
-        progress(12)
-
-        nfaces *= 4
-
-        self.fvert = self.fvert.reshape((nfaces,4))
-        self.fuvs  = self.fuvs.reshape((nfaces,4))
-        self.group = self.group.reshape(nfaces)
-        self.fnorm = np.zeros((nfaces,3))
-
-        # nfaces = len(fverts)
-        # 
-        # self.fvert = np.asarray(fverts, dtype=np.uint32)
-        # self.fnorm = np.zeros((nfaces, 3), dtype=np.float32)
-        # self.fuvs  = np.asarray(fuvs, dtype=np.uint32)
-        # self.group = np.asarray(groups, dtype=np.uint16)
-
-        progress(13)
-
-        self._update_faces()
-
-        progress(14)
-
-        self.updateIndexBuffer()
-
-        progress(15)
-
-        self.update_uvs()
+        self.fvert = topology['fvert']
+        self.fuvs = topology['fuvs']
+        self.group = topology['group']
+        self.fnorm = np.zeros((len(self.fvert),3))
 
-        progress(16)
-
-        self.update_coords()
-
-        progress(17)
-
-        self.calcNormals()
-
-        progress(18)
-
-        self.sync_all()
-
-        progress(19)
+        # The transparent faces are the last ones of the parent
+        first = len(self.parent.fvert) - self.parent.transparentPrimitives
+        self.transparentPrimitives = np.count_nonzero(topology['origin'] >= first)
 
     def dump(self):
         for k in dir(self):
@@ -293,94 +685,49 @@ class SubdivisionObject(Object3D):
                 np.savetxt('dump/%s.txt' % k, v, fmt=fmt)
 
     def update_uvs(self):
-        parent = self.parent
-
-        btexc = self.texco[:self.tcbase]
-        ctexc = self.texco[self.tcbase:self.tebase]
-        etexc = self.texco[self.tebase:]
-
-        ctexc[...] = np.sum(parent.texco[parent.fuvs[self.face_map]], axis=1) / 4
-
-        iva = self.etexc[:,0]
-        ivb = self.etexc[:,1]
-
-        ptexco = parent.texco[self.uv_map]
-
-        ta = ptexco[iva]
-        tb = ptexco[ivb]
-        etexc[...] = (ta + tb) / 2
-        del iva, ivb, ta, tb
-
-        btexc[...] = ptexco
-
+        self.uvStencil.apply(self.parent.texco, self.texco)
         self.markUVs()
 
-    def update_coords(self):
-        parent = self.parent
-
-        bvert = self.coord[:self.cbase]
-        cvert = self.coord[self.cbase:self.ebase]
-        evert = self.coord[self.ebase:]
-
-        cvert[...] = np.sum(parent.coord[parent.fvert[self.face_map]], axis=1) / 4
-
-        pcoord = parent.coord[self.vtx_map]
-
-        iva = self.evert[:,0,0]
-        ivb = self.evert[:,0,1]
-        ic1 = self.evert[:,1,0]
-        ic2 = self.evert[:,1,1]
-
-        va = pcoord[iva]
-        vb = pcoord[ivb]
-        mvert = va + vb
-        del iva, ivb, va, vb
-
-        vc1 = cvert[ic1]
-        vc2 = cvert[ic2]
-        vc = vc1 + vc2
-        del vc1, vc2
-
-        inedge = (ic1 == ic2)
-
-        evert[...] = np.where(inedge[:,None], mvert / 2, (mvert + vc) / 4)
-        del ic1, ic2, vc
-
-        nvface = parent.nfaces[self.vtx_map]
-
-        # comment: this code could really do with some comments
-        edgewt = np.arange(self.MAX_FACES)[None,:,None] < self.nedges[:,None,None]
-        edgewt2 = edgewt * inedge[self.vedge][:,:,None]
-        edgewt = edgewt / self.nedges.astype(np.float32)[:,None,None]
-        nvedge = np.sum(edgewt2, axis=1)
-        oevert = np.sum(mvert[self.vedge] * edgewt / 2, axis=1)
-        oevert2 = np.sum(mvert[self.vedge] * edgewt2 / 2, axis=1)
-        facewt = np.arange(self.MAX_FACES)[None,:,None] < nvface[:,None,None]
-        facewt = facewt / nvface.astype(np.float32)[:,None,None]
-        ofvert = np.sum(cvert[self.face_rmap[parent.vface[self.vtx_map]]] * facewt, axis=1)
-        opvert = pcoord
-
-        valid = nvface >= 3
-
-        bvert[...] = np.where(valid[:,None],
-                              np.where((self.nedges == nvface)[:,None],
-                                       (ofvert + 2 * oevert + (nvface[:,None] - 3) * opvert) / nvface[:,None],
-                                       (oevert2 + opvert) / (nvedge + 1)),
-                              (3 * oevert - ofvert) / 2)
-
-        self.markCoords(coor=True)
+    def update_coords(self, verts=None):
+        """
+        This method recomputes the coordinates of this object from those of
+        its parent. If verts is given, only the vertices which depend on
+        these vertices of the parent are recomputed, and their indices are
+        returned.
+        """
+
+        if verts is None:
+            self.stencil.apply(self.parent.coord, self.coord)
+            self.markCoords(coor=True)
+            return None
+        rows = self.stencil.getDependents(verts)
+        self.stencil.apply(self.parent.coord, self.coord, rows)
+        self.markCoords(rows, coor=True)
+        return rows
 
     def update(self):
         self.update_coords()
         super(SubdivisionObject, self).update()
 
-def createSubdivisionObject(object, progressCallback=None):
-    obj = SubdivisionObject(object)
+def createSubdivisionObject(object, progressCallback=None, levels=1, groups=None):
+    obj = SubdivisionObject(object, levels, groups)
     obj.create(progressCallback)
     # obj.dump()
     return obj
 
-def updateSubdivisionObject(object, progressCallback=None):
-    object.update()
-    object.calcNormals()
+def updateSubdivisionObject(object, progressCallback=None, verts=None):
+    """
+    Brings a subdivided object in line with its parent. verts are the
+    vertices of the parent which moved, None for all.
+    """
+
+    if verts is None:
+        object.update()
+        object.calcNormals()
+        object.sync_all()
+        return
+
+    rows = object.update_coords(verts)
+    faces = object.getFacesForVertices(rows)
+    object.calcNormals(1, 1, np.unique(object.fvert[faces]), faces)
     object.sync_all()
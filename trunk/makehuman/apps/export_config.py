@@ -23,8 +23,8 @@ TODO
 """
 
 import os
-import mh
 import shutil
+from getpath import getPath
 
 import log
 
@@ -39,7 +39,7 @@ def truthValue(word):
 #
 
 def proxyFilePtr(name):
-    head = os.path.normpath(mh.getPath(''))
+    head = os.path.normpath(getPath(''))
     for path in [head, './']:
         filename = os.path.realpath( os.path.join(path, name) )
         try:
@@ -147,7 +147,7 @@ def getExistingProxyFile(path, uuid, category):
     else:
         file = os.path.basename(path)
         paths = []
-        folder = os.path.join(mh.getPath(''), 'data', category)
+        folder = os.path.join(getPath(''), 'data', category)
         addProxyFiles(file, folder, paths, 6)
         folder = os.path.join('data', category)
         addProxyFiles(file, folder, paths, 6)
@@ -401,6 +401,7 @@ def getOutFileName(filePath, fromDir, isTexture, human, config):
             done = False
         if not done:
             if 0 and human:
+                import mh
                 img = mh.Image(human.getTexture())
                 log.debug("%s", dir(img))
                 img.save(toPath)
@@ -0,0 +1,130 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           Marc Flerackers
+
+**Copyright(c):**      MakeHuman Team 2001-2013
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+The sliders and undo actions which drive the modifiers of humanmodifier
+from the GUI.
+"""
+
+import gui3d
+import gui
+import targets
+
+class DetailAction:
+
+    def __init__(self, human, before, after, postAction=None,update=True):
+        self.name = 'Change detail'
+        self.human = human
+        self.before = before
+        self.after = after
+        self.postAction = postAction
+        self.update=update
+
+    def do(self):
+        for (target, value) in self.after.iteritems():
+            self.human.setDetail(target, value)
+        self.human.applyAllTargets(gui3d.app.progress, update=self.update)
+        if self.postAction:
+            self.postAction()
+        return True
+
+    def undo(self):
+        for (target, value) in self.before.iteritems():
+            self.human.setDetail(target, value)
+        self.human.applyAllTargets()
+        if self.postAction:
+            self.postAction()
+        return True
+
+class ModifierAction:
+
+    def __init__(self, human, modifier, before, after, postAction):
+        self.name = 'Change modifier'
+        self.human = human
+        self.modifier = modifier
+        self.before = before
+        self.after = after
+        self.postAction = postAction
+
+    def do(self):
+        self.modifier.setValue(self.human, self.after)
+        self.human.applyAllTargets(gui3d.app.progress)
+        self.postAction()
+        return True
+
+    def undo(self):
+        self.modifier.setValue(self.human, self.before)
+        self.human.applyAllTargets(gui3d.app.progress)
+        self.postAction()
+        return True
+        
+class ModifierSlider(gui.Slider):
+    
+    def __init__(self, value=0.0, min=0.0, max=1.0, label=None, modifier=None, valueConverter=None,
+                 warpResetNeeded=True, image=None):
+        super(ModifierSlider, self).__init__(value, min, max, label, valueConverter=valueConverter, image=image)
+        self.modifier = modifier
+        self.value = None
+        self.warpResetNeeded = warpResetNeeded
+        
+    def onChanging(self, value):
+        
+        if gui3d.app.settings.get('realtimeUpdates', True):
+            human = gui3d.app.selectedHuman
+            if self.value is None:
+                self.value = self.modifier.getValue(human)
+            self.modifier.updateValue(human, value, gui3d.app.settings.get('realtimeNormalUpdates', True))
+            human.warpsNeedReset = self.warpResetNeeded
+            
+    def onChange(self, value):
+        
+        human = gui3d.app.selectedHuman
+        if self.value != value:
+            gui3d.app.do(ModifierAction(human, self.modifier, self.value, value, self.update))
+        self.value = None
+        human.warpsNeedReset = self.warpResetNeeded
+        
+    def update(self):
+        
+        human = gui3d.app.selectedHuman
+        self.setValue(self.modifier.getValue(human))
+
+class GenericSlider(ModifierSlider):
+    @staticmethod
+    def findImage(name):
+        if name is None:
+            return None
+        name = name.lower()
+        return targets.getTargets().images.get(name, name)
+
+    def __init__(self, min, max, modifier, label, image, view):
+        image = self.findImage(image)
+        super(GenericSlider, self).__init__(min=min, max=1.0, label=label, modifier=modifier, image=image)
+        self.view = getattr(gui3d.app, view)
+
+    def onFocus(self, event):
+        super(GenericSlider, self).onFocus(event)
+        if gui3d.app.settings.get('cameraAutoZoom', True):
+            self.view()
+
+class UniversalSlider(GenericSlider):
+    def __init__(self, modifier, label, image, view):
+        min = -1.0 if modifier.left is not None else 0.0
+        super(UniversalSlider, self).__init__(min, 1.0, modifier, label, image, view)
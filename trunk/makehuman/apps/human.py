@@ -24,19 +24,42 @@ TODO
 
 import numpy as np
 import algos3d
-import gui3d
+import guicommon
 import os
 import humanmodifier
 import events3d
 import warp
-import mh
+import symmetry
 import log
+from core import G
 
-class Human(gui3d.Object):
+def splitAmount(amount):
+    """
+    Returns the two macro values of an amount between -1 and 1, its positive
+    part and its negative part, for instance the old and child values of an
+    age. This works on numbers as well as on arrays of amounts.
+    """
+
+    return np.maximum(amount, 0.0), np.maximum(-amount, 0.0)
+
+def rebalanceRaces(old, new, others):
+    """
+    Returns the values of the other two races when one race goes from old to
+    new. They keep their proportions and the three races still add up to
+    one; if the race was at one before, they share the rest evenly. This
+    works on numbers as well as on arrays of values.
+    """
+
+    rest = 1 - old
+    even = rest < 1e-6
+    scale = (1 - new) / np.maximum(rest, 1e-6)
+    return [even * (1 - new) / 2 + (1 - even) * value * scale for value in others]
+
+class Human(guicommon.Object):
 
     def __init__(self, mesh, hairObj=None):
 
-        gui3d.Object.__init__(self, [0, 0, 0], mesh, True)
+        guicommon.Object.__init__(self, [0, 0, 0], mesh, True)
         
         self.warpsNeedReset = True
         self.armature = None
@@ -54,7 +77,9 @@ class Human(gui3d.Object):
         self.clothesProxies = {}
         self.activeClothing = None
         self.targetsDetailStack = {}  # All details targets applied, with their values
+        self.morphEngine = algos3d.MorphEngine(self.meshData)
         self.symmetryModeEnabled = False
+        self.mirrorMap = None
 
         self.enableUVInterpolation = 0
         self.targetUVBuffer = {}
@@ -113,7 +138,7 @@ class Human(gui3d.Object):
 
     def setPosition(self, position):
         dv = [x-y for x, y in zip(position, self.getPosition())]
-        gui3d.Object.setPosition(self, position)
+        guicommon.Object.setPosition(self, position)
         if self.hairObj:
             self.hairObj.setPosition([x+y for x, y in zip(self.hairObj.getPosition(), dv)])
         for obj in self.clothesObjs.values():
@@ -123,7 +148,7 @@ class Human(gui3d.Object):
         self.callEvent('onTranslated', self)
 
     def setRotation(self, rotation):
-        gui3d.Object.setRotation(self, rotation)
+        guicommon.Object.setRotation(self, rotation)
         if self.hairObj:
             self.hairObj.setRotation(rotation)
         for obj in self.clothesObjs.values():
@@ -133,7 +158,7 @@ class Human(gui3d.Object):
         self.callEvent('onRotated', self)
             
     def setSolid(self, *args, **kwargs):
-        gui3d.Object.setSolid(self, *args, **kwargs)
+        guicommon.Object.setSolid(self, *args, **kwargs)
         if self.hairObj:
             self.hairObj.setSolid(*args, **kwargs)
         for obj in self.clothesObjs.values():
@@ -141,7 +166,7 @@ class Human(gui3d.Object):
                 obj.setSolid(*args, **kwargs)
             
     def setSubdivided(self, *args, **kwargs):
-        gui3d.Object.setSubdivided(self, *args, **kwargs)
+        guicommon.Object.setSubdivided(self, *args, **kwargs)
         if self.hairObj:
             self.hairObj.setSubdivided(*args, **kwargs)
         for obj in self.clothesObjs.values():
@@ -199,16 +224,7 @@ class Human(gui3d.Object):
             return 0.5
 
     def _setAgeVals(self, amount):
-        if amount >= 0:
-            if self.oldVal == amount and self.childVal == 0:
-                return
-            self.oldVal = amount
-            self.childVal = 0
-        else:
-            if self.childVal == -amount and self.oldVal == 0:
-                return
-            self.childVal = -amount
-            self.oldVal = 0
+        self.oldVal, self.childVal = splitAmount(amount)
         self.youngVal = 1 - (self.oldVal + self.childVal)
 
     def setWeight(self, weight):
@@ -236,16 +252,7 @@ class Human(gui3d.Object):
             return 0.5
 
     def _setWeightVals(self, amount):
-        if amount >= 0:
-            if self.overweightVal == amount and self.underweightVal == 0:
-                return
-            self.overweightVal = amount
-            self.underweightVal = 0
-        else:
-            if self.underweightVal == -amount and self.overweightVal == 0:
-                return
-            self.underweightVal = -amount
-            self.overweightVal = 0
+        self.overweightVal, self.underweightVal = splitAmount(amount)
 
     def setMuscle(self, muscle):
         """
@@ -272,30 +279,15 @@ class Human(gui3d.Object):
             return 0.5
 
     def _setMuscleVals(self, amount):
-        if amount >= 0:
-            if self.muscleVal == amount and self.flaccidVal == 0:
-                return
-            self.muscleVal = amount
-            self.flaccidVal = 0
-        else:
-            if self.flaccidVal == -amount and self.muscleVal == 0:
-                return
-            self.flaccidVal = -amount
-            self.muscleVal = 0
+        self.muscleVal, self.flaccidVal = splitAmount(amount)
 
     def setCaucasian(self, caucasian, sync=True):
         caucasian = min(max(caucasian, 0.0), 1.0)
-        old = 1 - self.caucasianVal
+        old = self.caucasianVal
         self.caucasianVal = caucasian
         if not sync:
             return
-        new = 1 - self.caucasianVal
-        if old < 1e-6:
-            self.asianVal = new / 2
-            self.africanVal = new / 2
-        else:
-            self.asianVal *= new / old
-            self.africanVal *= new / old
+        self.asianVal, self.africanVal = rebalanceRaces(old, caucasian, (self.asianVal, self.africanVal))
         self.callEvent('onChanging', events3d.HumanEvent(self, 'caucasian'))
         
     def getCaucasian(self):
@@ -303,17 +295,11 @@ class Human(gui3d.Object):
             
     def setAfrican(self, african, sync=True):
         african = min(max(african, 0.0), 1.0)
-        old = 1 - self.africanVal
+        old = self.africanVal
         self.africanVal = african
         if not sync:
             return
-        new = 1 - self.africanVal
-        if old < 1e-6:
-            self.caucasianVal = new / 2
-            self.asianVal = new / 2
-        else:
-            self.caucasianVal *= new / old
-            self.asianVal *= new / old
+        self.caucasianVal, self.asianVal = rebalanceRaces(old, african, (self.caucasianVal, self.asianVal))
         self.callEvent('onChanging', events3d.HumanEvent(self, 'african'))
         
     def getAfrican(self):
@@ -321,17 +307,11 @@ class Human(gui3d.Object):
             
     def setAsian(self, asian, sync=True):
         asian = min(max(asian, 0.0), 1.0)
-        old = 1 - self.asianVal
+        old = self.asianVal
         self.asianVal = asian
         if not sync:
             return
-        new = 1 - self.asianVal
-        if old < 1e-6:
-            self.caucasianVal = new / 2
-            self.africanVal = new / 2
-        else:
-            self.caucasianVal *= new / old
-            self.africanVal *= new / old
+        self.caucasianVal, self.africanVal = rebalanceRaces(old, asian, (self.caucasianVal, self.africanVal))
         self.callEvent('onChanging', events3d.HumanEvent(self, 'asian'))
 
     def getAsian(self):
@@ -361,16 +341,7 @@ class Human(gui3d.Object):
             return 0.0
 
     def _setHeightVals(self, amount):
-        if amount >= 0:
-            if self.giantVal == amount and self.dwarfVal == 0:
-                return
-            self.giantVal = amount
-            self.dwarfVal = 0
-        else:
-            if self.dwarfVal == -amount and self.giantVal == 0:
-                return
-            self.dwarfVal = -amount
-            self.giantVal = 0
+        self.giantVal, self.dwarfVal = splitAmount(amount)
             
     def setDetail(self, name, value):
         if value:
@@ -399,34 +370,28 @@ class Human(gui3d.Object):
 
     def applyAllTargets(self, progressCallback=None, update=True):
         """
-        This method applies all targets, in function of age and sex
+        This method applies all targets, in function of age and sex.
+        Only the targets whose value changed since the last call are
+        re-applied, see algos3d.MorphEngine.
 
         **Parameters:** None.
 
         """        
-        algos3d.resetObj(self.meshData)
-
         if progressCallback:
             progressCallback(0.0)
-        progressVal = 0.0
-        progressIncr = 0.5 / (len(self.targetsDetailStack) + 1)
 
-        for (targetPath, morphFactor) in self.targetsDetailStack.iteritems():
-            algos3d.loadTranslationTarget(self.meshData, targetPath, morphFactor, None, 0, 0)
-            
-            progressVal += progressIncr
-            if progressCallback:
-                progressCallback(progressVal)
-                
-        
+        verts = self.morphEngine.apply(self.targetsDetailStack)
+
+        if progressCallback:
+            progressCallback(0.5)
+
         # Update all verts
         self.getSeedMesh().update()
-        self.updateProxyMesh()
+        self.updateProxyMesh(verts)
         if self.isSubdivided():
-            self.updateSubdivisionMesh()
-            if progressCallback:
-                progressCallback(0.7)
-            self.mesh.calcNormals()
+            # Only the subdivided vertices (and normals) which depend on the
+            # moved vertices are recomputed
+            self.updateSubdivisionMesh(verts)
             if progressCallback:
                 progressCallback(0.8)
             if update:
@@ -475,7 +440,11 @@ class Human(gui3d.Object):
     def symmetrize(self, direction='r'):
         """
         This method applies either left to right or right to left symmetry to
-        the currently selected body parts.
+        the currently selected body parts. The l-/r- targets are mirrored in
+        the detail stack, and the mesh itself is mirrored with mirrorMesh so
+        that deformations which are not named targets become symmetric too.
+        What mirrorMesh changes is kept as a correction of the morph engine,
+        which is saved with the model.
 
 
         Parameters
@@ -502,8 +471,6 @@ class Human(gui3d.Object):
             # Reset previous targets on symm side
 
             if targetName[:2] == prefix2:
-                targetVal = self.targetsDetailStack[target]
-                algos3d.loadTranslationTarget(self.meshData, target, -targetVal, None, 1, 0)
                 del self.targetsDetailStack[target]
 
         # Apply symm target. For horiz movement the value must be inverted
@@ -517,14 +484,65 @@ class Human(gui3d.Object):
                     targetSym = targetSym.replace('trans-in', 'trans-out')
                 elif 'trans-out' in targetSym:
                     targetSym = targetSym.replace('trans-out', 'trans-in')
-                algos3d.loadTranslationTarget(self.meshData, targetSym, targetSymVal, None, 1, 1)
                 self.targetsDetailStack[targetSym] = targetSymVal
-        
-        self.updateProxyMesh()        
-        if self.isSubdivided():
-            self.getSubdivisionMesh()
 
-        mh.redraw()
+        # Apply the swapped targets first, mirroring afterwards keeps the
+        # deformations which are not in the detail stack
+        moved = self.morphEngine.apply(self.targetsDetailStack)
+        self.mirrorMesh(direction, moved)
+
+    def getMirrorMap(self):
+        """
+        Returns the mirror map of the base mesh, built on the first call.
+        """
+
+        if self.mirrorMap is None:
+            self.mirrorMap = symmetry.MirrorMap(self.meshData.orig_coord,
+                                                symmetry.loadPairs(symmetry.pairsPath),
+                                                symmetry.loadCenters(symmetry.centersPath))
+        return self.mirrorMap
+
+    def mirrorMesh(self, direction='r', moved=()):
+        """
+        This method makes the current shape of the mesh symmetric in one array
+        operation, whatever deformed it: targets, custom targets or warps.
+        The change is not recorded in the detail stack but added to the
+        correction of the morph engine, so that it is kept when the targets
+        are applied again.
+
+        Parameters
+        ----------
+
+        direction:
+            *string*. 'r' copies the right side onto the left side, 'l' the
+            left side onto the right side, as in symmetrize.
+
+        moved:
+            *array*. Optional: the vertices which were moved since the mesh was
+            last updated, whose normals must be refreshed too. None means the
+            whole mesh changed. Defaults to no vertex.
+        """
+
+        coord = self.meshData.coord
+        before = coord.copy()
+        verts = self.getMirrorMap().symmetrize(coord, self.meshData.orig_coord, direction)
+        self.morphEngine.addCorrection(verts, coord[verts] - before[verts])
+        if moved is None:
+            self.meshData.calcNormals()
+        else:
+            if len(moved):
+                verts = np.union1d(verts, moved)
+            # The neighbours of the moved vertices get new normals too
+            faces = self.meshData.getFacesForVertices(verts)
+            verts = np.unique(self.meshData.fvert[faces])
+            self.meshData.calcNormals(1, 1, verts, faces)
+        self.meshData.update()
+
+        self.updateProxyMesh(None if moved is None else verts)
+        self.updateSubdivisionMesh(None if moved is None else verts)
+
+        if G.app is not None:
+            G.app.redraw()
 
     def storeMesh(self):
         log.message("Storing mesh status")
@@ -554,6 +572,7 @@ class Human(gui3d.Object):
         self.breastSize = 0.0
         self.breastFirmness = 0.5
         self.targetsDetailStack = {}
+        self.morphEngine.setCorrection(None)
         
         self.setTexture("data/textures/texture.png")
         
@@ -563,6 +582,7 @@ class Human(gui3d.Object):
     def load(self, filename, update=True, progressCallback=None):
         
         self.resetMeshValues()
+        correction = []
 
         f = open(filename, 'r')
 
@@ -593,13 +613,21 @@ class Human(gui3d.Object):
                     self.setHeight(float(lineData[1]))
                 elif lineData[0] == 'asymmetry':
                     self.targetsDetailStack['data/targets/asym/' + lineData[1] + '.target'] = float(lineData[2])
-                elif lineData[0] in gui3d.app.loadHandlers:
-                    gui3d.app.loadHandlers[lineData[0]](self, lineData)
+                elif lineData[0] == 'correction':
+                    correction.append([float(x) for x in lineData[1:5]])
+                elif G.app is not None and lineData[0] in G.app.loadHandlers:
+                    G.app.loadHandlers[lineData[0]](self, lineData)
                 else:
                     log.message('Could not load %s', lineData)
 
         f.close()
 
+        if correction:
+            correction = np.array(correction)
+            delta = np.zeros((len(self.meshData.orig_coord), 3), dtype=np.float32)
+            delta[correction[:,0].astype(int)] = correction[:,1:]
+            self.morphEngine.setCorrection(delta)
+
         self.syncRace()
 
         self.callEvent('onChanged', events3d.HumanEvent(self, 'load'))
@@ -625,9 +653,16 @@ class Human(gui3d.Object):
         for t in self.targetsDetailStack.keys():
             if '/asym' in t:
                f.write('asymmetry %s %f\n' % (os.path.basename(t).replace('.target', ''), self.targetsDetailStack[t]))
+
+        # The translations of mirrorMesh, for the vertices which moved
+        correction = self.morphEngine.correction
+        if correction is not None:
+            for i in np.argwhere(np.any(np.abs(correction) > 1e-6, axis=1))[...,0]:
+                f.write('correction %d %f %f %f\n' % ((i,) + tuple(correction[i])))
                
-        for handler in gui3d.app.saveHandlers:
-            handler(self, f)
+        if G.app is not None:
+            for handler in G.app.saveHandlers:
+                handler(self, f)
                
         f.close()
 
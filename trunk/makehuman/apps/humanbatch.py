@@ -0,0 +1,218 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2013
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Headless generation of many humans at once.
+
+A HumanBatch takes a matrix with one row per human and one column per
+modifier, and returns the morphed coordinates of all humans as one array.
+The target weights are computed by the modifiers themselves, on a
+BatchState which holds the macro values of all humans as arrays, and the
+targets are applied with one sparse product (algos3d.MorphEngine.morphBatch).
+No GUI object is created.
+
+    mesh = files3d.loadMesh('data/3dobjs/base.obj')
+    batch = HumanBatch(mesh, [macroModifier('Gender'), macroModifier('Age')])
+    coords = batch.generate(np.random.rand(1000, 2))
+"""
+
+import numpy as np
+import algos3d
+import module3d
+import humanmodifier
+import human
+
+# Parameters of the macro modifiers, as in the Macro modelling task
+macroModifiers = {
+    'Gender': ('macrodetails', None, 0.0, 1.0),
+    'Age': ('macrodetails', None, 0.0, 1.0),
+    'Muscle': ('macrodetails', 'universal', 0.0, 1.0),
+    'Weight': ('macrodetails', 'universal', 0.0, 1.0),
+    'Height': ('macrodetails', 'universal-stature', -1.0, 1.0),
+    'African': ('macrodetails', None, 0.0, 1.0),
+    'Asian': ('macrodetails', None, 0.0, 1.0),
+    'Caucasian': ('macrodetails', None, 0.0, 1.0),
+    'breastSize': ('breast', None, -1.0, 1.0),
+    'breastFirmness': ('breast', None, 0.0, 1.0)
+    }
+
+def macroModifier(variable):
+    """
+    Returns the macro modifier for a variable, for instance 'Gender' or
+    'Weight'.
+    """
+
+    base, name, min, max = macroModifiers[variable]
+    return humanmodifier.MacroModifier(base, name, variable, min, max)
+
+class BatchState(object):
+    """
+    The state of a number of humans, with the attributes of human.Human which
+    the modifiers use, as arrays with one value per human. The setters
+    follow those of human.Human.
+    """
+
+    def __init__(self, count):
+        self.count = count
+
+        def constant(value):
+            return np.repeat(np.float64(value), count)
+
+        self.childVal = constant(0.0)
+        self.oldVal = constant(0.0)
+        self.youngVal = constant(1.0)
+        self.femaleVal = constant(0.5)
+        self.maleVal = constant(0.5)
+        self.flaccidVal = constant(0.0)
+        self.muscleVal = constant(0.0)
+        self.overweightVal = constant(0.0)
+        self.underweightVal = constant(0.0)
+        self.caucasianVal = constant(1.0/3)
+        self.asianVal = constant(1.0/3)
+        self.africanVal = constant(1.0/3)
+        self.dwarfVal = constant(0.0)
+        self.giantVal = constant(0.0)
+        self.breastSize = constant(0.0)
+        self.breastFirmness = constant(0.5)
+        self.targetsDetailStack = {}
+
+    def setDetail(self, name, value):
+        self.targetsDetailStack[name] = np.zeros(self.count) + value
+
+    def getDetail(self, name):
+        return self.targetsDetailStack.get(name, np.zeros(self.count))
+
+    def setGender(self, gender):
+        self.maleVal = np.clip(gender, 0.0, 1.0)
+        self.femaleVal = 1 - self.maleVal
+
+    def setAge(self, age):
+        self.oldVal, self.childVal = human.splitAmount(-1 + 2 * np.clip(age, 0.0, 1.0))
+        self.youngVal = 1 - (self.oldVal + self.childVal)
+
+    def setWeight(self, weight):
+        self.overweightVal, self.underweightVal = human.splitAmount(-1 + 2 * np.clip(weight, 0.0, 1.0))
+
+    def setMuscle(self, muscle):
+        self.muscleVal, self.flaccidVal = human.splitAmount(-1 + 2 * np.clip(muscle, 0.0, 1.0))
+
+    def setHeight(self, height):
+        self.giantVal, self.dwarfVal = human.splitAmount(np.clip(height, -1.0, 1.0))
+
+    # Setting a race rebalances the other two, as on a Human
+    def setCaucasian(self, caucasian):
+        caucasian = np.clip(caucasian, 0.0, 1.0)
+        self.asianVal, self.africanVal = human.rebalanceRaces(self.caucasianVal, caucasian, (self.asianVal, self.africanVal))
+        self.caucasianVal = caucasian
+
+    def setAfrican(self, african):
+        african = np.clip(african, 0.0, 1.0)
+        self.caucasianVal, self.asianVal = human.rebalanceRaces(self.africanVal, african, (self.caucasianVal, self.asianVal))
+        self.africanVal = african
+
+    def setAsian(self, asian):
+        asian = np.clip(asian, 0.0, 1.0)
+        self.caucasianVal, self.africanVal = human.rebalanceRaces(self.asianVal, asian, (self.caucasianVal, self.africanVal))
+        self.asianVal = asian
+
+class HumanBatch(object):
+    """
+    Generates the coordinates of many humans at once.
+    """
+
+    def __init__(self, mesh, modifiers):
+        """
+        This method initializes a batch.
+
+        Parameters
+        ----------
+
+        mesh:
+            *3d object*. The base mesh, as loaded by files3d.loadMesh.
+
+        modifiers:
+            *list*. The modifiers (instances of humanmodifier.GenericModifier)
+            which the columns of the value matrices are fed to.
+        """
+
+        self.mesh = mesh
+        self.modifiers = list(modifiers)
+        self.engine = algos3d.MorphEngine(mesh)
+
+    def getDetails(self, values):
+        """
+        Returns the target weights for a matrix of modifier values, as a
+        dictionary of target paths and arrays with one weight per human.
+        """
+
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim != 2 or values.shape[1] != len(self.modifiers):
+            raise ValueError('expected a matrix with %d columns' % len(self.modifiers))
+
+        state = BatchState(len(values))
+        columns = zip(self.modifiers, values.T)
+
+        # The macro values go first, the other modifiers depend on them
+        for modifier, column in columns:
+            if isinstance(modifier, humanmodifier.MacroModifier):
+                modifier.setValue(state, column)
+        for modifier, column in columns:
+            if isinstance(modifier, humanmodifier.MacroModifier):
+                humanmodifier.GenericModifier.setValue(modifier, state, column)
+            else:
+                modifier.setValue(state, column)
+
+        return state.targetsDetailStack
+
+    def generate(self, values, normals=False):
+        """
+        Returns the coordinates of one human per row of values, as a float32
+        array of shape (humans, vertices, 3). If normals is set, the vertex
+        normals are returned as well, in an array of the same shape.
+
+        Parameters
+        ----------
+
+        values:
+            *array*. A matrix of shape (humans, modifiers) of modifier values.
+
+        normals:
+            *boolean*. Whether to compute the vertex normals.
+        """
+
+        coords = self.engine.morphBatch(self.getDetails(values))
+        if not normals:
+            return coords
+        return coords, self.calcNormals(coords)
+
+    def calcNormals(self, coords):
+        """
+        Returns the vertex normals of a batch of coordinates, computed like
+        Object3D.calcNormals.
+        """
+
+        mesh = self.mesh
+        result = np.empty_like(coords)
+        for i, coord in enumerate(coords):
+            fnorm = module3d.faceNormals(coord[mesh.fvert], mesh.areaWeightedNormals)
+            norms = module3d.sumAdjacent(fnorm, mesh.vfaceIndptr, mesh.vfaceIndices)
+            norms /= np.sqrt(np.sum(norms ** 2, axis=-1))[:,None]
+            result[i] = norms
+        return result
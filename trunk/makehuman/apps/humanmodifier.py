@@ -25,13 +25,12 @@ TODO
 __docformat__ = 'restructuredtext'
 
 import algos3d
-import gui3d
 import events3d
 import operator
 import math
 import re
+from collections import OrderedDict
 import numpy as np
-import gui
 import log
 import targets
 
@@ -109,121 +108,6 @@ import targets
 # cup1 : -min(0, breastSize)
 # cup2 :  max(0, breastSize)
 
-class DetailAction:
-
-    def __init__(self, human, before, after, postAction=None,update=True):
-        self.name = 'Change detail'
-        self.human = human
-        self.before = before
-        self.after = after
-        self.postAction = postAction
-        self.update=update
-
-    def do(self):
-        for (target, value) in self.after.iteritems():
-            self.human.setDetail(target, value)
-        self.human.applyAllTargets(gui3d.app.progress, update=self.update)
-        if self.postAction:
-            self.postAction()
-        return True
-
-    def undo(self):
-        for (target, value) in self.before.iteritems():
-            self.human.setDetail(target, value)
-        self.human.applyAllTargets()
-        if self.postAction:
-            self.postAction()
-        return True
-
-class ModifierAction:
-
-    def __init__(self, human, modifier, before, after, postAction):
-        self.name = 'Change modifier'
-        self.human = human
-        self.modifier = modifier
-        self.before = before
-        self.after = after
-        self.postAction = postAction
-
-    def do(self):
-        self.modifier.setValue(self.human, self.after)
-        self.human.applyAllTargets(gui3d.app.progress)
-        self.postAction()
-        return True
-
-    def undo(self):
-        self.modifier.setValue(self.human, self.before)
-        self.human.applyAllTargets(gui3d.app.progress)
-        self.postAction()
-        return True
-        
-class ModifierSlider(gui.Slider):
-    
-    def __init__(self, value=0.0, min=0.0, max=1.0, label=None, modifier=None, valueConverter=None,
-                 warpResetNeeded=True, image=None):
-        super(ModifierSlider, self).__init__(value, min, max, label, valueConverter=valueConverter, image=image)
-        self.modifier = modifier
-        self.value = None
-        self.warpResetNeeded = warpResetNeeded
-        
-    def onChanging(self, value):
-        
-        if gui3d.app.settings.get('realtimeUpdates', True):
-            human = gui3d.app.selectedHuman
-            if self.value is None:
-                self.value = self.modifier.getValue(human)
-                if human.isSubdivided():
-                    if human.isProxied():
-                        human.getProxyMesh().setVisibility(1)
-                    else:
-                        human.getSeedMesh().setVisibility(1)
-                    human.getSubdivisionMesh(False).setVisibility(0)
-            self.modifier.updateValue(human, value, gui3d.app.settings.get('realtimeNormalUpdates', True))
-            human.updateProxyMesh()
-            human.warpsNeedReset = self.warpResetNeeded
-            
-    def onChange(self, value):
-        
-        human = gui3d.app.selectedHuman
-        if self.value != value:
-            gui3d.app.do(ModifierAction(human, self.modifier, self.value, value, self.update))
-        if human.isSubdivided():
-            if human.isProxied():
-                human.getProxyMesh().setVisibility(0)
-            else:
-                human.getSeedMesh().setVisibility(0)
-            human.getSubdivisionMesh(False).setVisibility(1)
-        self.value = None
-        human.warpsNeedReset = self.warpResetNeeded
-        
-    def update(self):
-        
-        human = gui3d.app.selectedHuman
-        self.setValue(self.modifier.getValue(human))
-
-class GenericSlider(ModifierSlider):
-    @staticmethod
-    def findImage(name):
-        if name is None:
-            return None
-        name = name.lower()
-        return targets.getTargets().images.get(name, name)
-
-    def __init__(self, min, max, modifier, label, image, view):
-        image = self.findImage(image)
-        super(GenericSlider, self).__init__(min=min, max=1.0, label=label, modifier=modifier, image=image)
-        self.view = getattr(gui3d.app, view)
-
-    def onFocus(self, event):
-        super(GenericSlider, self).onFocus(event)
-        if gui3d.app.settings.get('cameraAutoZoom', True):
-            self.view()
-
-class UniversalSlider(GenericSlider):
-    def __init__(self, modifier, label, image, view):
-        min = -1.0 if modifier.left is not None else 0.0
-        super(UniversalSlider, self).__init__(min, 1.0, modifier, label, image, view)
-
 class BaseModifier(object):
 
     def __init__(self):
@@ -244,8 +128,7 @@ class BaseModifier(object):
         
         return sum([human.getDetail(target[0]) for target in self.targets])
 
-    def buildLists(self):
-        human = gui3d.app.selectedHuman
+    def buildLists(self, human):
         # Collect vertex and face indices if we didn't yet
         if self.verts is None and self.faces is None:
             # Collect verts
@@ -259,25 +142,33 @@ class BaseModifier(object):
             # collect faces
             self.faces = human.meshData.getFacesForVertices(self.verts)
 
+    def updateDetails(self, human, value):
+        """
+        Sets the value of this modifier while its slider is dragged.
+
+        Returns a blend for algos3d.MorphEngine.apply which replaces the
+        per-target update of the changed targets, or None.
+        """
+
+        self.setValue(human, value)
+        return None
+
     def updateValue(self, human, value, updateNormals=1):
         if self.verts is None and self.faces is None:
-            self.buildLists()
+            self.buildLists(human)
 
         # Update detail state
-        old_detail = [human.getDetail(target[0]) for target in self.targets]
-        self.setValue(human, value)
-        new_detail = [human.getDetail(target[0]) for target in self.targets]
+        blend = self.updateDetails(human, value)
 
         # Apply changes
-        for target, old, new in zip(self.targets, old_detail, new_detail):
-            if new == old:
-                continue
-            algos3d.loadTranslationTarget(human.meshData, target[0], new - old, None, 0, 0)
+        moved = human.morphEngine.apply(human.targetsDetailStack, blend)
         
         # Update vertices
         if updateNormals:
             human.meshData.calcNormals(1, 1, self.verts, self.faces)
         human.meshData.update(self.verts, updateNormals)
+        human.updateProxyMesh(moved)
+        human.updateSubdivisionMesh(moved)
         human.warpNeedReset = True
         human.callEvent('onChanging', events3d.HumanEvent(human, self.eventType))
 
@@ -355,19 +246,47 @@ class GenericModifier(BaseModifier):
         return result
 
     def clampValue(self, value):
-        value = min(1.0, value)
         if self.left is not None:
-            value = max(-1.0, value)
+            return np.clip(value, -1.0, 1.0)
         else:
-            value = max( 0.0, value)
-        return value
+            return np.clip(value, 0.0, 1.0)
+
+    def getFactorArrays(self):
+        """
+        Returns the names of the factors used by the targets of this modifier
+        and an index array of shape (targets, factors) into them. Rows are
+        padded with the index one past the last name, which is given the
+        value 1.0. The arrays are built once per modifier.
+        """
+
+        if getattr(self, '_factorArrays', None) is None:
+            names = sorted(set(factor for tpath, tfactors in self.targets for factor in tfactors))
+            lookup = dict((name, i) for i, name in enumerate(names))
+            width = max([len(tfactors) for tpath, tfactors in self.targets] + [1])
+            index = np.empty((len(self.targets), width), dtype=np.intp)
+            index.fill(len(names))
+            for i, (tpath, tfactors) in enumerate(self.targets):
+                index[i,:len(tfactors)] = [lookup[factor] for factor in tfactors]
+            self._factorArrays = names, index
+        return self._factorArrays
+
+    def getWeights(self, factors):
+        """
+        Returns the weight of every target of this modifier, as the product
+        of its factors. If some factors are arrays (one value per human, see
+        humanbatch), the result has one row of weights per target.
+        """
+
+        names, index = self.getFactorArrays()
+        values = np.array(np.broadcast_arrays(*([factors[name] for name in names] + [1.0])))
+        return np.prod(values[index], axis=1)
 
     def setValue(self, human, value):
         value = self.clampValue(value)
         factors = self.getFactors(human, value)
 
-        for tpath, tfactors in self.targets:
-            human.setDetail(tpath, reduce((lambda x, y: x * y), [factors[factor] for factor in tfactors]))
+        for (tpath, tfactors), weight in zip(self.targets, self.getWeights(factors)):
+            human.setDetail(tpath, weight)
 
     @staticmethod
     def parseTarget(target):
@@ -400,8 +319,8 @@ class GenericModifier(BaseModifier):
             'giant': human.giantVal,
             'firmness0': 1.0 - human.breastFirmness,
             'firmness1': human.breastFirmness,
-            'cup1': -min(human.breastSize, 0.0),
-            'cup2': max(0.0, human.breastSize)
+            'cup1': -np.minimum(human.breastSize, 0.0),
+            'cup2': np.maximum(0.0, human.breastSize)
             }
 
         return factors
@@ -424,14 +343,27 @@ class UniversalModifier(GenericModifier):
         factors = super(UniversalModifier, self).getFactors(human, value)
 
         if self.left is not None:
-            factors[self.left] = -min(value, 0.0)
+            factors[self.left] = -np.minimum(value, 0.0)
         if self.center is not None:
             factors[self.center] = 1.0 - abs(value)
-        factors[self.right] = max(0.0, value)
+        factors[self.right] = np.maximum(0.0, value)
 
         return factors
 
 class MacroModifier(GenericModifier):
+    _categories = {
+        'Gender': 'gender',
+        'Age': 'age',
+        'Muscle': 'tone',
+        'Weight': 'weight',
+        'Height': 'height',
+        'African': 'race',
+        'Asian': 'race',
+        'Caucasian': 'race',
+        'breastSize': 'cup',
+        'breastFirmness': 'firmness'
+        }
+
     def __init__(self, base, name, variable, min, max):
         super(MacroModifier, self).__init__()
 
@@ -462,12 +394,132 @@ class MacroModifier(GenericModifier):
         super(MacroModifier, self).setValue(human, value)
 
     def clampValue(self, value):
-        return max(self.min, min(self.max, value))
+        return np.clip(value, self.min, self.max)
 
     def getFactors(self, human, value):
         factors = super(MacroModifier, self).getFactors(human, value)
         factors[self.name] = 1.0
         return factors
 
-    def buildLists(self):
+    def getVariableFactors(self):
+        """
+        Returns the names of the factors which change with the variable of
+        this modifier.
+        """
+
+        category = self._categories.get(self.variable)
+        if category is None:
+            return []
+        return targets.Component._cat_values[category]
+
+    def updateDetails(self, human, value):
+        before = self.getFactors(human, self.getValue(human))
+        self.setValue(human, value)
+        after = self.getFactors(human, self.getValue(human))
+        return macroBasis.getBlend(human, self, before, after)
+
+    def buildLists(self, human):
         pass
+
+class MacroBasis(object):
+    """
+    A cache of blended macro targets, used while a macro slider is dragged.
+
+    The weight of a macro target is the product of one factor which depends
+    on the dragged variable (say 'male' or 'female' for the gender) and of
+    the factors of the other macro variables, which stay fixed during the
+    drag. Summing the targets per factor of the dragged variable, weighted
+    by the product of their other factors, gives one delta field per value
+    of the variable. A change of the variable then moves the mesh by a
+    weighted sum of these few fields, whatever the number of targets.
+
+    The fields are cached per modifier and per (quantized) value of the
+    other factors.
+    """
+
+    quantum = 1e-4
+    size = 8
+
+    def __init__(self):
+        self._entries = OrderedDict()
+
+    def clear(self):
+        self._entries.clear()
+
+    def getEntry(self, human, modifier, factors):
+        """
+        Returns the blended fields of a modifier for the values of the fixed
+        factors in factors, building them if they are not cached.
+        """
+
+        keys = modifier.getVariableFactors()
+        names, index = modifier.getFactorArrays()
+        fixed = [name for name in names if name not in keys]
+        key = (modifier.name, modifier.variable,
+               tuple(int(round(factors[name] / self.quantum)) for name in fixed))
+
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            entry = self.buildEntry(human, modifier, factors)
+        self._entries[key] = entry
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        return entry
+
+    def buildEntry(self, human, modifier, factors):
+        keys = modifier.getVariableFactors()
+        paths = []
+        slots = []
+        rests = []
+        targets = []
+        for tpath, tfactors in modifier.targets:
+            slot = [i for i, key in enumerate(keys) if key in tfactors]
+            if len(slot) != 1:
+                # Constant during the drag
+                continue
+            rest = 1.0
+            for factor in tfactors:
+                if factor not in keys:
+                    rest *= factors[factor]
+            if not rest:
+                continue
+            target = algos3d.getTarget(human.meshData, tpath)
+            if not len(target.verts):
+                continue
+            paths.append(tpath)
+            slots.append(slot[0])
+            rests.append(rest)
+            targets.append(target)
+
+        if targets:
+            verts = np.unique(np.concatenate([target.verts for target in targets]))
+        else:
+            verts = np.zeros(0, dtype=np.uint32)
+        fields = np.zeros((len(keys), len(verts), 3), dtype=np.float32)
+        for slot, rest, target in zip(slots, rests, targets):
+            fields[slot, np.searchsorted(verts, target.verts)] += target.data * np.float32(rest)
+
+        return paths, np.array(slots, dtype=np.intp), np.array(rests), verts, fields
+
+    def getBlend(self, human, modifier, before, after):
+        """
+        Returns the translation caused by the change of the factors of a macro
+        modifier from before to after, as a blend for MorphEngine.apply:
+        a tuple (paths, old weights, new weights, vertex indices, delta).
+        Returns None if the change cannot be expressed with the fields.
+        """
+
+        keys = modifier.getVariableFactors()
+        if not keys:
+            return None
+        for name in modifier.getFactorArrays()[0]:
+            if name not in keys and before[name] != after[name]:
+                return None
+
+        paths, slots, rests, verts, fields = self.getEntry(human, modifier, after)
+        old = np.array([before[key] for key in keys])
+        new = np.array([after[key] for key in keys])
+        delta = np.tensordot((new - old).astype(np.float32), fields, 1)
+        return paths, old[slots] * rests, new[slots] * rests, verts, delta
+
+macroBasis = MacroBasis()
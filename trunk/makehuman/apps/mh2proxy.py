@@ -28,9 +28,6 @@ import aljabr
 import export_config
 import log
 
-import mhx
-from mhx import the
-
 #
 #    class CProxy
 #
@@ -90,12 +87,21 @@ class CProxy:
         self.shapekeys = []
         self.weights = None
         self.refVerts = []
+        self.refArrays = None
         self.clothings = []
         self.transparencies = dict()
         self.textures = []
         return
         
-    def update(self, obj, parent):
+    def update(self, obj, parent, parentVerts=None):
+        """
+        Fits the proxy mesh obj to its parent mesh. parentVerts are the
+        indices of the parent vertices which moved, None for all; only the
+        proxy vertices which depend on them are refitted.
+
+        Returns the indices of the refitted proxy vertices, None for all.
+        """
+
         rlen = len(self.refVerts)
         mlen = len(obj.verts)
         if rlen != mlen:
@@ -108,24 +114,60 @@ class CProxy:
         yScale = getScale(self.yScaleData, parent.verts, 1)
         zScale = getScale(self.zScaleData, parent.verts, 2)
 
-        verts = []
-        for n in range(mlen):
-            refVert = self.refVerts[n]
-            if type(refVert) == tuple:
-                (rv0, rv1, rv2, w0, w1, w2, d0, d1, d2) = refVert
-                v0 = parent.verts[rv0]
-                v1 = parent.verts[rv1]
-                v2 = parent.verts[rv2]
-                nv0 = w0*v0.co[0] + w1*v1.co[0] + w2*v2.co[0] + d0*xScale
-                nv1 = w0*v0.co[1] + w1*v1.co[1] + w2*v2.co[1] + d1*yScale
-                nv2 = w0*v0.co[2] + w1*v1.co[2] + w2*v2.co[2] + d2*zScale
-                verts.append( (nv0, nv1, nv2) )
-            else:
-                verts.append( parent.verts[refVert].co )
-                
-        obj.changeCoords(verts)      
+        ref, weights, offsets = self.getRefArrays()
+        index = None
+        if parentVerts is not None:
+            index = self.getDependents(parent, parentVerts)
+        if index is not None:
+            ref, weights, offsets = ref[index], weights[index], offsets[index]
+
+        coord = np.asarray(parent.coord, dtype=np.float64)[ref]
+        verts = np.sum(coord * weights[...,None], axis=1)
+        verts += offsets * (xScale, yScale, zScale)
+
+        obj.changeCoords(verts, index)
         log.debug("clo %s", str((xScale, yScale, zScale)) )
-        
+        return index
+
+    def getDependents(self, parent, parentVerts):
+        """
+        Returns the indices of the proxy vertices which depend on the given
+        parent vertices, or None if one of them is a reference of the scales,
+        since the offsets of all proxy vertices are scaled then.
+        """
+
+        moved = np.zeros(len(parent.coord), dtype=bool)
+        moved[parentVerts] = True
+        for data in (self.xScaleData, self.yScaleData, self.zScaleData):
+            if data and (moved[data[0]] or moved[data[1]]):
+                return None
+
+        ref, weights, offsets = self.getRefArrays()
+        return np.argwhere((moved[ref] & (weights != 0)).any(axis=1))[...,0]
+
+    def getRefArrays(self):
+        """
+        Returns the reference vertices of the proxy as arrays: the indices of
+        the three parent vertices, their weights and the offsets, each of
+        shape (n, 3). A reference to a single vertex has the weights (1,0,0)
+        and no offset. The arrays are built once and kept.
+        """
+
+        if self.refArrays is None or len(self.refArrays[0]) != len(self.refVerts):
+            nverts = len(self.refVerts)
+            ref = np.zeros((nverts, 3), dtype=np.uint32)
+            weights = np.zeros((nverts, 3), dtype=np.float64)
+            offsets = np.zeros((nverts, 3), dtype=np.float64)
+            for n, refVert in enumerate(self.refVerts):
+                if type(refVert) == tuple:
+                    ref[n] = refVert[0:3]
+                    weights[n] = refVert[3:6]
+                    offsets[n] = refVert[6:9]
+                else:
+                    ref[n,0] = refVert
+                    weights[n,0] = 1
+            self.refArrays = (ref, weights, offsets)
+        return self.refArrays
 
     def getUuid(self):
         if self.uuid:
@@ -758,6 +800,8 @@ def calcJointPos(obj, joint):
 #
 
 def writeRigBones(fp, bones):
+    from mhx import the
+
     ox = the.Origin[0]
     oy = the.Origin[1]
     oz = the.Origin[2]
@@ -790,6 +834,8 @@ def getRadius(key, options):
         return None
 
 def writeRigPose(fp, name, bones):
+    import mhx
+
     circles = []
     cubes = []
     for (bone, head, tail, roll, parent, options) in bones:
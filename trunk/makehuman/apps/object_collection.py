@@ -26,7 +26,6 @@ TODO
 
 import module3d
 import aljabr
-import mh
 import files3d
 import mh2bvh
 import os
@@ -35,7 +34,6 @@ import numpy
 import shutil
 import mh2proxy
 import export_config
-import mhx
 import log
 
 #
@@ -393,6 +391,8 @@ def nextName(string):
 #
 
 def getArmatureFromRigFile(fileName, obj):
+    import mhx
+
     (locations, armature, weights) = mhx.read_rig.readRigFile(fileName, obj)
     
     hier = []
@@ -26,6 +26,7 @@ import gui3d
 import armature
 import warpmodifier
 import humanmodifier
+import guimodifier
 import log
 
 def resetPoseMode():
@@ -118,15 +119,15 @@ def changePoseMode(event):
 #   class PoseModifierSlider
 #----------------------------------------------------------
 
-class PoseModifierSlider(humanmodifier.ModifierSlider):
+class PoseModifierSlider(guimodifier.ModifierSlider):
     def __init__(self, label, modifier):        
-        humanmodifier.ModifierSlider.__init__(self, label=label, modifier=modifier, warpResetNeeded=False)
+        guimodifier.ModifierSlider.__init__(self, label=label, modifier=modifier, warpResetNeeded=False)
         
     def onChanging(self, value):   
         enterPoseMode()
-        humanmodifier.ModifierSlider.onChanging(self, value)
+        guimodifier.ModifierSlider.onChanging(self, value)
             
     def onChange(self, value):    
         enterPoseMode()
-        humanmodifier.ModifierSlider.onChange(self, value)
+        guimodifier.ModifierSlider.onChange(self, value)
        
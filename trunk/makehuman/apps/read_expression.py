@@ -25,11 +25,11 @@ TODO
 import os
 import fastmath
 import math
-import gui3d
 import warp
 import warpmodifier
 import algos3d
 import log
+from core import G
 
 
 #----------------------------------------------------------
@@ -149,18 +149,13 @@ def targetFileName(typ, name, gender, age):
 def readShape(filename):                
     #print ("Try", filename)        
     try:
-        fp = open(filename, "rU")
-    except:
+        index, delta = algos3d.readTargetFile(filename, extraColumns=True)
+    except IOError:
         log.error("*** Cannot open %s", filename)
         return None
         
-    shape = {}                    
-    for line in fp:
-        words = line.split()
-        n = int(words[0])
-        if n < algos3d.NMHVerts:
-            shape[n] = (float(words[1]), float(words[2]), float(words[3]))    
-    fp.close()
+    keep = index < algos3d.NMHVerts
+    shape = dict(zip(index[keep].tolist(), map(tuple, delta[keep].tolist())))
     log.message("    %s copied", filename)
     return shape
 
@@ -188,7 +183,7 @@ def readFaceShapes(human, drivers, t0, t1):
         except:
             doLoad = True
         if doLoad:
-            gui3d.app.progress(t, text="Reading face shape %s" % fname)
+            G.app.progress(t, text="Reading face shape %s" % fname)
                 
             shape = warpmodifier.compileWarpTarget(
                     'shared/mhx/targets/body_language/${gender}-${age}/%s.target' % fname, 
@@ -208,7 +203,7 @@ def readExpressions(human, t0, t1):
     t,dt = initTimes(Expressions, 0.0, 1.0)
 
     for name in Expressions:
-        gui3d.app.progress(t, text="Reading expression %s" % name)
+        G.app.progress(t, text="Reading expression %s" % name)
             
         shape = warpmodifier.compileWarpTarget(
                 'data/targets/expression/${gender}_${age}/neutral_${gender}_${age}_%s.target' % name,
@@ -227,7 +222,7 @@ def readExpressionUnits(human, t0, t1):
     t,dt = initTimes(ExpressionUnits, 0.0, 1.0)
     
     for name in ExpressionUnits:
-        gui3d.app.progress(t, text="Reading expression %s" % name)
+        G.app.progress(t, text="Reading expression %s" % name)
 
         shape = warpmodifier.compileWarpTarget(
                 'data/targets/expression/units/${ethnic}/${gender}_${age}/%s.target' % name,
@@ -245,7 +240,7 @@ def readCorrectives(drivers, human, folder, landmarks, t0, t1):
     t,dt = initTimes(drivers, 0.0, 1.0)
     
     for (pose, lr, expr, vars) in drivers:
-        gui3d.app.progress(t, text="Reading corrective %s %s" % (folder, pose))
+        G.app.progress(t, text="Reading corrective %s %s" % (folder, pose))
 
         shape = warpmodifier.compileWarpTarget(
                 "shared/mhx/targets/correctives/%s/caucasian/${gender}-${age}-${tone}-${weight}/%s.target" % (folder, pose),
@@ -29,7 +29,7 @@ import files3d
 import fastmath
 import math
 from operator import mul
-import mh
+from getpath import getPath
 import os
 import warp
 import humanmodifier
@@ -130,7 +130,7 @@ class WarpModifier (humanmodifier.SimpleModifier):
         global theModifierTypes, theBaseCharacterParts
                 
         string = template.replace('$','').replace('{','').replace('}','')                
-        warppath = os.path.join(mh.getPath(""), "warp", string)
+        warppath = os.path.join(getPath(""), "warp", string)
         if not os.path.exists(os.path.dirname(warppath)):
             os.makedirs(os.path.dirname(warppath))
         if not os.path.exists(warppath):
@@ -455,22 +455,14 @@ def compileWarpTarget(template, fallback, human, bodypart):
 
 def readTarget(path):
     try:        
-        fp = open(path, "r")
-    except:
-        fp = None
-    if fp:
-        target = zeroVerts()
-        for line in fp:
-            words = line.split()
-            if len(words) >= 4:
-                n = int(words[0])
-                if n < algos3d.NMHVerts:
-                    target[n] = [float(words[1]), float(words[2]), float(words[3])]
-        fp.close()
-        return target
-    else:
+        index, delta = algos3d.readTargetFile(path, extraColumns=True)
+    except IOError:
         log.message("Could not find %s" % os.path.realpath(path))
         return None
+    keep = index < algos3d.NMHVerts
+    target = zeroVerts()
+    target.update(zip(index[keep].tolist(), delta[keep].tolist()))
+    return target
 
 #----------------------------------------------------------
 #   For testing numpy
@@ -0,0 +1,432 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2013
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Exports saved models (.mhm files) without starting the GUI.
+
+    python batch_export.py -f obj,dae,stl -o exports models/ more.mhm list.txt
+
+The arguments are .mhm files, directories (searched recursively for .mhm
+files) or manifests listing one .mhm path per line. The models are spread
+over a pool of worker processes. Each worker loads the base mesh, the
+modifiers of the modelling plugin and the targets once, then loads and
+exports the models it is given with Human.load and the apps/mh2 exporters.
+A report with the time spent per model and the overall throughput is
+written at the end.
+
+This must be run from the MakeHuman directory, and needs neither Qt nor
+OpenGL. The modelling modifiers, the proxy, the clothes and the hair are
+restored from the models; lines handled by other plugins (skeletons,
+poses, textures, ...) are skipped.
+"""
+
+import sys
+import os
+import time
+import optparse
+import multiprocessing
+
+import makehuman
+makehuman.set_sys_path()
+
+formats = ['obj', 'dae', 'stl']
+
+def exportObj(human, path):
+    import mh2obj_proxy
+
+    options = {
+        "helpers": False,
+        "hidden": True,
+        "eyebrows": True,
+        "lashes": True,
+        "scale": (1.0, "decimeter"),
+        "subdivide": False
+    }
+    mh2obj_proxy.exportProxyObj(human, path, options)
+
+def exportDae(human, path):
+    import mh2collada
+
+    options = {
+        "daerig": "game",
+        "rotate90X": False,
+        "rotate90Z": False,
+        "eyebrows": True,
+        "lashes": True,
+        "helpers": False,
+        "hidden": True,
+        "scale": (1.0, "decimeter")
+    }
+    mh2collada.exportCollada(human, path, options)
+
+def exportStl(human, path):
+    import mh2stl
+
+    mh2stl.exportStlAscii(human.meshData, path)
+
+exporters = {
+    'obj': exportObj,
+    'dae': exportDae,
+    'stl': exportStl
+    }
+
+def findModels(paths):
+    """
+    Returns the .mhm files given by a list of files, directories and
+    manifests.
+    """
+
+    models = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                models.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith('.mhm'))
+        elif path.lower().endswith('.mhm'):
+            models.append(path)
+        else:
+            folder = os.path.dirname(path)
+            with open(path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        models.append(os.path.join(folder, line))
+    return models
+
+class ModifierGroup(object):
+    """
+    The modifiers of one modelling task, restored from the model files
+    like ModifierTaskView does.
+    """
+
+    def __init__(self, group, features):
+        import modifierdefs
+
+        self.group = group
+        self.modifiers = {}
+        for name, base, templates in features:
+            modifierdefs.createModifiers(base, templates, self.modifiers)
+
+    def loadHandler(self, human, values):
+        if values[0] == self.group:
+            modifier = self.modifiers.get(values[1], None)
+            if modifier:
+                modifier.setValue(human, float(values[2]))
+
+    def updateMacro(self, human):
+        import humanmodifier
+
+        for modifier in self.modifiers.itervalues():
+            if isinstance(modifier, humanmodifier.MacroModifier):
+                modifier.setValue(human, modifier.getValue(human))
+
+class ProxyLibrary(object):
+    """
+    The proxy, clothes and hair of the models, restored from the model files
+    like the proxy, clothes and hair libraries do, without a scene to add
+    the objects to.
+    """
+
+    def loadProxy(self, human, values):
+        import mh2proxy
+
+        filename = values[1]
+        if os.path.basename(filename) == "clear.proxy":
+            human.setProxy(None)
+            return
+        proxy = mh2proxy.readProxyFile(human.getSeedMesh(), filename, False)
+        human.setProxy(proxy)
+        human.updateProxyMesh()
+
+    def loadClothes(self, human, values):
+        import export_config
+        import log
+
+        uuid = values[2] if len(values) >= 3 else None
+        mhclo = export_config.getExistingProxyFile(values[1], uuid, "clothes")
+        if not mhclo:
+            log.notice("%s does not exist. Skipping.", values[1])
+        else:
+            self.setClothes(human, mhclo)
+
+    def setClothes(self, human, filepath):
+        import files3d
+        import guicommon
+        import mh2proxy
+        import export_config
+        import log
+
+        if os.path.basename(filepath) == "clear.mhclo":
+            human.clothesObjs.clear()
+            human.clothesProxies.clear()
+            human.activeClothing = None
+            return
+
+        proxy = mh2proxy.readProxyFile(human.meshData, filepath, False)
+        if not proxy:
+            return
+
+        # Costumes are sets of individual clothes
+        if proxy.clothings:
+            for (pieceName, uuid) in proxy.clothings:
+                mhclo = export_config.getExistingProxyFile(pieceName+".mhclo", uuid, "clothes")
+                if mhclo:
+                    self.setClothes(human, mhclo)
+                else:
+                    log.warning("Could not load clothing %s", pieceName)
+            return
+
+        (folder, name) = proxy.obj_file
+        mesh = files3d.loadMesh(os.path.join(folder, name))
+        if not mesh:
+            log.error("Could not load mesh for clothing object %s", proxy.name)
+            return
+        if proxy.texture:
+            (dir, name) = proxy.texture
+            tex = os.path.join(folder, name)
+            if not os.path.exists(tex):
+                tex = os.path.join('data', 'clothes', 'textures', name)
+            mesh.setTexture(tex)
+
+        uuid = proxy.getUuid()
+        human.clothesObjs[uuid] = guicommon.Object(human.getPosition(), mesh)
+        human.clothesProxies[uuid] = proxy
+        human.activeClothing = uuid
+
+    def loadHair(self, human, values):
+        import files3d
+        import guicommon
+        import mh2proxy
+        import log
+
+        mhclo = values[1]
+        if not os.path.exists(os.path.realpath(mhclo)):
+            log.notice('%s does not exist. Skipping.', mhclo)
+            return
+        obj = mhclo.replace(".mhclo", ".obj")
+        if os.path.basename(obj) == "clear.obj":
+            return
+
+        mesh = files3d.loadMesh(obj)
+        if mesh:
+            human.hairProxy = mh2proxy.readProxyFile(human.meshData, mhclo, False)
+            if human.hairProxy.texture:
+                (folder, name) = human.hairProxy.texture
+                mesh.setTexture(os.path.join(folder, name))
+            else:
+                mesh.setTexture(obj.replace('.obj', '_texture.png'))
+            human.hairObj = guicommon.Object(human.getPosition(), mesh)
+
+    def reset(self, human):
+        human.setProxy(None)
+        human.clothesObjs.clear()
+        human.clothesProxies.clear()
+        human.activeClothing = None
+        human.hairObj = None
+        human.hairProxy = None
+
+    def adaptToHuman(self, human):
+        for (uuid, clo) in human.clothesObjs.items():
+            mesh = clo.getSeedMesh()
+            human.clothesProxies[uuid].update(mesh, human.meshData)
+            mesh.update()
+        if human.hairObj and human.hairProxy:
+            mesh = human.hairObj.getSeedMesh()
+            human.hairProxy.update(mesh, human.meshData)
+            mesh.update()
+
+class Application(object):
+    """
+    Stand-in for the application, with what Human needs: the load and save
+    handlers of the model files, the settings and redraw. It has no splash
+    screen, status bar or log window for the log handlers to write to.
+    """
+
+    def __init__(self):
+        self.loadHandlers = {}
+        self.saveHandlers = []
+        self.settings = {}
+        self.selectedHuman = None
+        self.splash = None
+        self.statusBar = None
+        self.log_window = None
+
+    def redraw(self):
+        pass
+
+    def progress(self, value, text=None):
+        pass
+
+# The state of a worker process
+worker = None
+
+class Worker(object):
+    """
+    Loads and exports models in a worker process, keeping the human, its
+    modifiers and the loaded targets from one model to the next.
+    """
+
+    def __init__(self, outdir, formats, warm):
+        import files3d
+        import human
+        import algos3d
+        import log
+        from core import G
+
+        self.outdir = outdir
+        self.formats = formats
+
+        self.app = Application()
+        G.app = self.app
+
+        import modifierdefs
+
+        self.groups = []
+        for name, label, group, features in modifierdefs.tasks:
+            group = ModifierGroup(group, features)
+            # The macro modifiers are loaded by Human itself
+            if group.group is not None:
+                self.app.loadHandlers[group.group] = group.loadHandler
+            self.groups.append(group)
+
+        self.library = ProxyLibrary()
+        self.app.loadHandlers['proxy'] = self.library.loadProxy
+        self.app.loadHandlers['clothes'] = self.library.loadClothes
+        self.app.loadHandlers['hair'] = self.library.loadHair
+
+        self.human = human.Human(files3d.loadMesh("data/3dobjs/base.obj"))
+        self.app.selectedHuman = self.human
+
+        @self.human.mhEvent
+        def onChanging(event):
+            if event.change == 'reset':
+                self.library.reset(event.human)
+
+        @self.human.mhEvent
+        def onChanged(event):
+            if event.change in ('reset', 'load', 'random'):
+                for group in self.groups:
+                    group.updateMacro(event.human)
+            self.library.adaptToHuman(event.human)
+
+        if warm:
+            t0 = time.time()
+            for group in self.groups:
+                for modifier in group.modifiers.itervalues():
+                    for target in modifier.targets:
+                        algos3d.getTarget(self.human.meshData, target[0])
+            log.message('worker %d: loaded %d targets in %.2fs', os.getpid(), len(algos3d.targetBuffer), time.time() - t0)
+
+    def export(self, path):
+        result = {
+            'model': path,
+            'pid': os.getpid(),
+            'error': None,
+            'times': {}
+            }
+        t0 = time.time()
+        try:
+            self.human.load(path, True)
+            t1 = time.time()
+            result['times']['load'] = t1 - t0
+            name = os.path.splitext(os.path.basename(path))[0]
+            for format in self.formats:
+                exporters[format](self.human, os.path.join(self.outdir, '%s.%s' % (name, format)))
+                t2 = time.time()
+                result['times'][format] = t2 - t1
+                t1 = t2
+        except Exception, e:
+            result['error'] = '%s: %s' % (e.__class__.__name__, e)
+        result['times']['total'] = time.time() - t0
+        return result
+
+def initWorker(outdir, formats, warm):
+    global worker
+    worker = Worker(outdir, formats, warm)
+
+def exportModel(path):
+    return worker.export(path)
+
+def writeReport(path, results, formats, workers, wallTime):
+    columns = ['load'] + formats + ['total']
+    failed = [result for result in results if result['error']]
+    with open(path, 'w') as f:
+        f.write('# %s\n' % '\t'.join(['model', 'pid'] + columns + ['error']))
+        for result in results:
+            times = ['%.3f' % result['times'][column] if column in result['times'] else '-' for column in columns]
+            f.write('%s\n' % '\t'.join([result['model'], str(result['pid'])] + times + [result['error'] or '']))
+
+        f.write('\n')
+        f.write('# models: %d, failed: %d, workers: %d\n' % (len(results), len(failed), workers))
+        f.write('# wall time: %.2fs, throughput: %.2f models/s\n' % (wallTime, len(results) / max(wallTime, 1e-6)))
+        for column in columns:
+            times = [result['times'][column] for result in results if column in result['times']]
+            if times:
+                f.write('# %s: mean %.3fs, max %.3fs\n' % (column, sum(times) / len(times), max(times)))
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] model.mhm|directory|manifest ...')
+    parser.add_option('-f', '--formats', default='obj',
+                      help='comma separated export formats, out of %s [default: %%default]' % ', '.join(formats))
+    parser.add_option('-o', '--output', default='exports',
+                      help='output directory [default: %default]')
+    parser.add_option('-j', '--jobs', type='int', default=multiprocessing.cpu_count(),
+                      help='number of worker processes [default: %default]')
+    parser.add_option('-r', '--report', default=None,
+                      help='report file [default: OUTPUT/batch_report.txt]')
+    parser.add_option('--cold', action='store_false', dest='warm', default=True,
+                      help='do not load all targets when a worker starts')
+    options, args = parser.parse_args()
+
+    exportFormats = [format.strip().lower() for format in options.formats.split(',') if format.strip()]
+    for format in exportFormats:
+        if format not in exporters:
+            parser.error('unknown format %s' % format)
+
+    models = findModels(args)
+    if not models:
+        parser.error('no models given')
+
+    if not os.path.isdir(options.output):
+        os.makedirs(options.output)
+    report = options.report or os.path.join(options.output, 'batch_report.txt')
+
+    makehuman.init_logging()
+
+    print 'Exporting %d models to %s with %d workers' % (len(models), ', '.join(exportFormats), options.jobs)
+    t0 = time.time()
+    pool = multiprocessing.Pool(options.jobs, initWorker, (options.output, exportFormats, options.warm))
+    results = []
+    for result in pool.imap_unordered(exportModel, models):
+        results.append(result)
+        if result['error']:
+            print '[%d/%d] %s failed: %s' % (len(results), len(models), result['model'], result['error'])
+        else:
+            print '[%d/%d] %s %.2fs' % (len(results), len(models), result['model'], result['times']['total'])
+    pool.close()
+    pool.join()
+    wallTime = time.time() - t0
+
+    results.sort(key=lambda result: result['model'])
+    writeReport(report, results, exportFormats, options.jobs, wallTime)
+    print 'Done in %.2fs (%.2f models/s), report written to %s' % (wallTime, len(results) / max(wallTime, 1e-6), report)
+
+if __name__ == '__main__':
+    main()
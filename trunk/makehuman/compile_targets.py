@@ -19,16 +19,33 @@
 Abstract
 --------
 
-TODO
+Compiles the .target files under data into the target pack.
+
+    python compile_targets.py [-j JOBS] [--force]
+
+The compilation is incremental. A manifest next to the pack records the
+modification time, size and md5 hash of each compiled .target file. A
+target whose file is unchanged is copied from the existing pack; only new
+and changed files are parsed, on a pool of worker processes. The whole pack
+is rebuilt when it is missing, when the base mesh or the quantum changed,
+or with --force.
 """
 
 import sys
 sys.path = ["./core", "./lib"] + sys.path
 import algos3d
+import files3d
 import os
-import zipfile
+import time
+import hashlib
+import optparse
+import multiprocessing
+import numpy as np
 import fnmatch
 
+manifestPath = 'data/targets.manifest'
+basePath = 'data/3dobjs/base.obj'
+
 def getAllFiles(rootPath, filterStrArr):
     result = [ None ]*len(filterStrArr)
     for root, dirnames, filenames in os.walk(rootPath):
@@ -44,24 +61,155 @@ def getFiles(root, filenames, filterStr):
         foundFiles.append(os.path.join(root, filename))
     return foundFiles
 
+def fileHash(path):
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def loadManifest(path):
+    """
+    Returns the header (topology hash and quantum) and the entries (name:
+    (mtime, size, hash)) of a manifest, or None if there is none.
+    """
+
+    if not os.path.isfile(path):
+        return None
+    header = {}
+    entries = {}
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('#'):
+                key, value = line[1:].split(None, 1)
+                header[key] = value
+            elif line:
+                name, mtime, size, digest = line.split('\t')
+                entries[name] = (float(mtime), int(size), digest)
+    return header, entries
+
+def writeManifest(path, header, entries):
+    with open(path, 'w') as f:
+        for key, value in sorted(header.iteritems()):
+            f.write('#%s %s\n' % (key, value))
+        for name, (mtime, size, digest) in sorted(entries.iteritems()):
+            f.write('%s\t%r\t%d\t%s\n' % (name, mtime, size, digest))
+
+# The base mesh of a worker process
+base = None
+
+def initWorker():
+    global base
+    base = files3d.loadMesh(basePath)
+
+def compileTarget(path):
+    """
+    Parses and quantizes one target in a worker process. Returns the path,
+    the compiled index, vector and faces, and the quantization error, or the
+    path and the error message if the target could not be converted.
+    """
+
+    try:
+        index, delta = algos3d.readTargetFile(path)
+        index, vector = algos3d.quantizeTarget(index, delta)
+        error = 0.0
+        if len(vector):
+            error = float(np.max(np.abs(vector * algos3d.Target.quantum - delta)))
+        return path, (index, vector, base.getFacesForVertices(index), error)
+    except StandardError, e:
+        return path, str(e)
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-j', '--jobs', type='int', default=multiprocessing.cpu_count(),
+                      help='number of worker processes [default: %default]')
+    parser.add_option('--force', action='store_true', default=False,
+                      help='recompile all targets')
+    options, args = parser.parse_args()
+
+    t0 = time.time()
+    mesh = files3d.loadMesh(basePath)
+    header = {
+        'topology': mesh.getTopologyHash(),
+        'quantum': repr(float(algos3d.Target.quantum))
+        }
 
-if __name__ == '__main__':
-    obj = algos3d.Target(None, None)
     allFiles = getAllFiles('data', ['*.target', '*.png'])
-    with zipfile.ZipFile('data/targets.npz', mode='w', compression=zipfile.ZIP_DEFLATED) as zip:
-        allTargets = allFiles[0]
-        print len(allFiles)
-        for (i, path) in enumerate(allTargets):
-            try:
-                obj._load_text(path)
-                iname, vname = obj._save_binary(path)
-                zip.write(iname)
-                zip.write(vname)
-                os.remove(iname)
-                os.remove(vname)
-                print "[%.0f%% done] converted target %s" % (100*(float(i)/float(len(allTargets))), path)
-            except StandardError, e:
-                print 'error converting target %s' % path
+    allTargets = allFiles[0]
+    paths = dict((path.replace('\\','/'), path) for path in allTargets)
+
+    # Find the targets which can be copied from the existing pack
+    old = None
+    manifest = None if options.force else loadManifest(manifestPath)
+    if manifest is None:
+        reason = 'forced' if options.force else 'no manifest'
+    elif manifest[0] != header:
+        reason = 'base mesh or quantum changed'
+    else:
+        try:
+            old = algos3d.TargetPack(algos3d.Target.packPath, algos3d.Target.packTablePath)
+            reason = None
+        except StandardError:
+            reason = 'no target pack'
+    if old is None:
+        print 'Compiling all targets (%s)' % reason
+
+    entries = {}
+    reused = {}
+    changed = []
+    added = []
+    for name, path in sorted(paths.iteritems()):
+        stat = os.stat(path)
+        entry = manifest[1].get(name) if old is not None else None
+        if entry is not None and name in old:
+            if entry[:2] == (stat.st_mtime, stat.st_size):
+                entries[name] = entry
+            else:
+                digest = fileHash(path)
+                if digest == entry[2]:
+                    entries[name] = (stat.st_mtime, stat.st_size, digest)
+            if name in entries:
+                index, vector = old[name]
+                reused[name] = (np.array(index), np.array(vector), np.array(old.getFaces(name)))
+                continue
+            changed.append(name)
+        else:
+            added.append(name)
+    removed = sorted(set(manifest[1]) - set(paths)) if old is not None else []
+    del old
+
+    # Parse the new and changed targets
+    compiled = {}
+    failed = []
+    maxError = 0.0
+    todo = [paths[name] for name in changed + added]
+    if todo:
+        print 'Converting %d targets with %d workers' % (len(todo), options.jobs)
+        pool = multiprocessing.Pool(options.jobs, initWorker)
+        for (i, (path, result)) in enumerate(pool.imap_unordered(compileTarget, todo, 16)):
+            name = path.replace('\\','/')
+            if isinstance(result, str):
+                print 'error converting target %s: %s' % (path, result)
+                failed.append(name)
+                continue
+            index, vector, faces, error = result
+            maxError = max(maxError, error)
+            compiled[name] = (index, vector, faces)
+            stat = os.stat(path)
+            entries[name] = (stat.st_mtime, stat.st_size, fileHash(path))
+            print "[%.0f%% done] converted target %s" % (100*(float(i+1)/float(len(todo))), path)
+        pool.close()
+        pool.join()
+        print "Maximum quantization error: %f" % maxError
+
+    if todo or removed or not os.path.isfile(algos3d.Target.packPath):
+        print "Writing target pack"
+        names = [name for name in sorted(paths) if name in compiled or name in reused]
+        arrays = [compiled.get(name) or reused[name] for name in names]
+        algos3d.TargetPack.write(algos3d.Target.packPath, algos3d.Target.packTablePath, names,
+                                 [a[0] for a in arrays], [a[1] for a in arrays], [a[2] for a in arrays],
+                                 header['topology'])
+        writeManifest(manifestPath, header, entries)
+    else:
+        print "Target pack is up to date"
 
     print "Writing images list"
     with open('data/images.list', 'w') as f:
@@ -69,4 +217,19 @@ if __name__ == '__main__':
         for path in allImages:
             path = path.replace('\\','/')
             f.write(path + '\n')
-    print "All done."
+
+    print
+    print "Summary:"
+    print "  reused:  %d" % len(reused)
+    print "  changed: %d" % len(changed)
+    print "  added:   %d" % len(added)
+    print "  removed: %d" % len(removed)
+    print "  failed:  %d" % len(failed)
+    for label, names in (('changed', changed), ('added', added), ('removed', removed), ('failed', failed)):
+        if 0 < len(names) <= 50:
+            for name in names:
+                print "  %s %s" % (label, name)
+    print "All done in %.2fs." % (time.time() - t0)
+
+if __name__ == '__main__':
+    main()
@@ -43,17 +43,397 @@ algorithms will be coded. For example:
 __docformat__ = 'restructuredtext'
 
 import os
+import threading
+import weakref
+from collections import OrderedDict
 import numpy as np
 import log
 
 NMHVerts = 18528
 
-targetBuffer = {}
+class TargetCache(object):
 
-class Target:
+    """
+    This class holds the targets loaded by getTarget, keyed by path.
+
+    The cache can be given a memory budget in bytes. When the targets in the
+    cache need more than that, the least recently used ones are evicted.
+    Targets used by the target stack of a morph engine are pinned and never
+    evicted, see pin(). Listeners (the morph engines) are told about every
+    target leaving the cache through their removeTarget method, so that they
+    can release their copy of its data.
+
+    Apart from that, the cache behaves like the dictionary it replaces.
+    """
+
+    def __init__(self, budget=None):
+        """
+        This method initializes an instance of the TargetCache class.
+
+        Parameters
+        ----------
+
+        budget:
+            *int*. The memory budget in bytes, or None for no limit.
+        """
+
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._targets = OrderedDict()
+        self._sizes = {}
+        self._pinned = weakref.WeakKeyDictionary()
+        self._listeners = weakref.WeakSet()
+
+    @staticmethod
+    def targetSize(target):
+        return sum(getattr(getattr(target, attr, None), 'nbytes', 0)
+                   for attr in ('verts', '_data', 'vector', 'faces'))
+
+    def setBudget(self, budget):
+        self.budget = budget
+        self._evict()
+
+    def pin(self, owner, paths):
+        """
+        Pins the targets with the given paths on behalf of owner, replacing
+        the targets previously pinned by the same owner. The pins are
+        dropped when the owner is garbage collected.
+        """
+
+        self._pinned[owner] = set(paths)
+
+    def isPinned(self, path):
+        return any(path in paths for paths in self._pinned.itervalues())
+
+    def addListener(self, listener):
+        self._listeners.add(listener)
+
+    def _removed(self, path):
+        self.size -= self._sizes.pop(path)
+        for listener in list(self._listeners):
+            listener.removeTarget(path)
+
+    def _evict(self):
+        if self.budget is None or self.size <= self.budget:
+            return
+        for path in self._targets.keys():
+            if self.size <= self.budget:
+                break
+            if self.isPinned(path):
+                continue
+            del self._targets[path]
+            self._removed(path)
+            self.evictions += 1
+
+    def __getitem__(self, path):
+        try:
+            target = self._targets.pop(path)
+        except KeyError:
+            self.misses += 1
+            raise
+        self._targets[path] = target
+        self.hits += 1
+        return target
+
+    def __setitem__(self, path, target):
+        if path in self._targets:
+            del self[path]
+        self._targets[path] = target
+        self._sizes[path] = self.targetSize(target)
+        self.size += self._sizes[path]
+        self._evict()
+
+    def __delitem__(self, path):
+        del self._targets[path]
+        self._removed(path)
+
+    def __contains__(self, path):
+        return path in self._targets
+
+    def __len__(self):
+        return len(self._targets)
+
+    def get(self, path, default=None):
+        try:
+            return self[path]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self._targets.keys()
+
+    def values(self):
+        return self._targets.values()
+
+    def items(self):
+        return self._targets.items()
+
+    def clear(self):
+        for path in self._targets.keys():
+            del self[path]
+
+    def getStats(self):
+        return dict(
+            targets = len(self._targets),
+            size = self.size,
+            budget = self.budget,
+            hits = self.hits,
+            misses = self.misses,
+            evictions = self.evictions)
+
+targetBuffer = TargetCache()
+
+class TargetPack(object):
+
+    """
+    This class gives access to the compiled targets written by
+    compile_targets.py.
+
+    The pack file is one contiguous blob holding the vertex indices (uint16)
+    of all targets, followed by their translation vectors (int16, in units of
+    1e-3) and the indices (uint32) of the faces they affect. A separate
+    offset table holds the name, offsets and lengths of each target. The
+    pack is opened with np.memmap, so the arrays of a target are slices of
+    the mapped file: nothing is read or decompressed until it is used, and
+    processes using the same pack share its pages.
+
+    The face lists are only valid for the base mesh they were computed on,
+    so the table also holds the topology hash of that mesh.
+    """
+
+    def __init__(self, path, tablePath):
+        """
+        This method opens a target pack.
+
+        Parameters
+        ----------
+
+        path:
+            *string*. The path of the pack file.
+
+        tablePath:
+            *string*. The path of the offset table (an npz file).
+        """
+
+        self.time = os.path.getmtime(path)
+
+        table = np.load(tablePath)
+        names = [str(name) for name in table['names']]
+        offsets = table['offsets']
+        counts = table['counts']
+        total = int(table['total'])
+        self.table = dict(zip(names, zip(offsets, counts)))
+
+        self.index = np.memmap(path, dtype=np.uint16, mode='r', shape=(total,))
+        self.vector = np.memmap(path, dtype=np.int16, mode='r', offset=2*total, shape=(total,3))
+
+        self.topology = None
+        self.faceTable = None
+        self._matches = weakref.WeakKeyDictionary()
+        if 'topology' in table.files:
+            self.topology = str(table['topology'])
+            ftotal = int(table['ftotal'])
+            self.faceTable = dict(zip(names, zip(table['foffsets'], table['fcounts'])))
+            if ftotal:
+                self.face = np.memmap(path, dtype=np.uint32, mode='r', offset=8*total, shape=(ftotal,))
+            else:
+                self.face = np.zeros(0, dtype=np.uint32)
+
+    def __contains__(self, name):
+        return name in self.table
+
+    def __getitem__(self, name):
+        """
+        Returns the indices and the quantized vectors of a target, as views
+        into the mapped file.
+        """
+
+        offset, count = self.table[name]
+        index = np.asarray(self.index[offset:offset+count])
+        vector = np.asarray(self.vector[offset:offset+count])
+        return index, vector
+
+    def matches(self, obj):
+        """
+        Returns whether the face lists in the pack are valid for obj.
+        """
+
+        if self.topology is None or obj is None:
+            return False
+        try:
+            return self._matches[obj]
+        except KeyError:
+            result = self._matches[obj] = obj.getTopologyHash() == self.topology
+            if not result:
+                log.message('compiled target faces do not match mesh %s', obj.name)
+            return result
+
+    def getFaces(self, name):
+        """
+        Returns the indices of the faces affected by a target, as a view into
+        the mapped file.
+        """
+
+        offset, count = self.faceTable[name]
+        return np.asarray(self.face[offset:offset+count])
+
+    def names(self):
+        return self.table.keys()
+
+    @staticmethod
+    def write(path, tablePath, names, indices, vectors, faces=None, topology=None):
+        """
+        Writes a target pack and its offset table.
+
+        Parameters
+        ----------
+
+        names:
+            *list of strings*. The names of the targets.
+
+        indices:
+            *list of arrays*. The vertex indices of each target, as uint16.
+
+        vectors:
+            *list of arrays*. The translation vectors of each target, as int16
+            in units of 1e-3.
+
+        faces:
+            *list of arrays*. Optional: the indices of the faces affected by
+            each target.
+
+        topology:
+            *string*. The topology hash of the mesh the faces belong to.
+        """
+
+        def offsetTable(arrays):
+            counts = np.array([len(array) for array in arrays], dtype=np.uint32)
+            offsets = np.zeros(len(counts), dtype=np.uint32)
+            np.cumsum(counts[:-1], out=offsets[1:])
+            return offsets, counts, int(np.sum(counts))
+
+        offsets, counts, total = offsetTable(indices)
+
+        with open(path, 'wb') as f:
+            for index in indices:
+                np.ascontiguousarray(index, dtype=np.uint16).tofile(f)
+            for vector in vectors:
+                np.ascontiguousarray(vector, dtype=np.int16).tofile(f)
+            if faces is not None:
+                for face in faces:
+                    np.ascontiguousarray(face, dtype=np.uint32).tofile(f)
+
+        table = dict(
+            names = np.array(names),
+            offsets = offsets,
+            counts = counts,
+            total = np.array(total))
+
+        if faces is not None:
+            foffsets, fcounts, ftotal = offsetTable(faces)
+            table.update(
+                foffsets = foffsets,
+                fcounts = fcounts,
+                ftotal = np.array(ftotal),
+                topology = np.array(topology))
+
+        np.savez(tablePath, **table)
+
+def readTargetFile(path, extraColumns=False, strict=False):
+    """
+    This function reads a .target text file, which lists one vertex index
+    and translation vector per line, and returns it as arrays.
+
+    The whole file is tokenized at once with numpy, with a nan appended to
+    every line, so that a line which does not hold exactly four numbers
+    shows up as a misplaced nan. Such files (blank lines, comments, missing
+    or trailing columns) are parsed line by line instead.
+
+    Parameters
+    ----------
+
+    path:
+        *string*. The file system path of the target file. An IOError is
+        raised if it cannot be opened, a ValueError if a vertex index is not
+        a non-negative integer or a value cannot be parsed.
+
+    extraColumns:
+        *bool*. Whether lines with more than four fields are read, ignoring
+        the fields after the fourth. By default they are skipped.
+
+    strict:
+        *bool*. Whether lines which are not read raise a ValueError instead
+        of being skipped.
+
+    Returns a tuple (index, delta): *uint32 array* of vertex indices and
+    *float32 array* of shape (n,3) with the translation vectors.
+    """
+
+    with open(path, 'rb') as fd:
+        text = fd.read()
+    if text and not text.endswith('\n'):
+        text += '\n'
+
+    values = np.fromstring(text.replace('\n', ' nan\n'), dtype=np.float64, sep=' ')
+    if len(values) == 5 * text.count('\n'):
+        values = values.reshape(-1, 5)
+        if np.isnan(values[:,4]).all() and not np.isnan(values[:,:4]).any():
+            index = values[:,0]
+            if (index >= 0).all() and (index < 2**32).all() and (index == np.floor(index)).all():
+                return index.astype(np.uint32), values[:,1:4].astype(np.float32)
+
+    index = []
+    delta = []
+    for line in text.splitlines():
+        words = line.split()
+        if len(words) == 4 or (extraColumns and len(words) > 4):
+            n = int(words[0])
+            if n < 0:
+                raise ValueError('negative vertex index in %s: %d' % (path, n))
+            index.append(n)
+            delta.append([float(word) for word in words[1:4]])
+        elif strict:
+            raise ValueError('bad line in %s: %r' % (path, line))
+    index = np.array(index, dtype=np.uint32)
+    delta = np.array(delta, dtype=np.float32).reshape(-1, 3)
+    return index, delta
+
+def quantizeTarget(index, delta):
+    """
+    This function converts the vertex indices and translation vectors of a
+    target to the compiled form stored in the target pack.
+
+    Parameters
+    ----------
+
+    index:
+        *array*. The vertex indices, as returned by readTargetFile.
+
+    delta:
+        *float array* of shape (n,3). The translation vectors.
+
+    Returns a tuple (index, vector): *uint16 array* of vertex indices and
+    *int16 array* of translation vectors in units of Target.quantum.
+    """
+
+    index = np.ascontiguousarray(index, dtype=np.uint16)
+    vector = np.ascontiguousarray(np.round(delta / Target.quantum), dtype=np.int16)
+    return index, vector
+
+class Target(object):
 
     """
     This class is used to store morph targets.
+
+    The translation vectors are stored as float32 in data, or, if the
+    quantize class attribute is set, as int16 in units of 1e-3 in vector,
+    which is how they are compiled on disk. Quantized targets take half the
+    memory; the vectors are scaled back while they are applied, and reading
+    data returns a dequantized copy.
     """
 
     def __init__(self, obj, name):
@@ -76,6 +456,9 @@ class Target:
         
         self.name = name
         self.morphFactor = -1
+        self.faces = None
+        self._data = None
+        self.vector = None
 
         try:
             self._load(self.name)
@@ -84,43 +467,59 @@ class Target:
             log.error('Unable to open %s', name)
             return
 
-        self.faces = obj.getFacesForVertices(self.verts)
+        if self.faces is None or not Target.pack.matches(obj):
+            self.faces = obj.getFacesForVertices(self.verts)
 
-    dtype = [('index','u4'),('vector','(3,)f4')]
-    npzfile = None
-    npztime = None
+    pack = None
+    packPath = 'data/targets.pack'
+    packTablePath = 'data/targets.index.npz'
+    quantize = False
+    quantum = np.float32(1e-3)
+
+    def _getData(self):
+        if self.vector is not None:
+            return self.vector * Target.quantum
+        return self._data
+
+    def _setData(self, data):
+        self._data = data
+        self.vector = None
+
+    data = property(_getData, _setData)
+
+    def _setVector(self, vector):
+        if Target.quantize:
+            self._data = None
+            self.vector = vector
+        else:
+            self.data = vector * Target.quantum
+
+    def getScaled(self, factor, index=np.s_[...]):
+        """
+        Returns the translation vectors of this target, or of the entries
+        selected by index, multiplied by factor. Quantized vectors are scaled
+        back in the same step.
+        """
+
+        if self.vector is not None:
+            return self.vector[index] * (factor * Target.quantum)
+        return self._data[index] * factor
 
     def _load_text(self, name):
-        data = []
-        with open(name) as fd:
-            for line in fd:
-                translationData = line.split()
-                if len(translationData) != 4:
-                    continue
-                vertIndex = int(translationData[0])
-                translationVector = (float(translationData[1]), float(translationData[2]), float(translationData[3]))
-                data.append((vertIndex, translationVector))
-
-        raw = np.asarray(data, dtype=Target.dtype)
-        self.verts = raw['index']
-        self.data = raw['vector']
-
-    def _load_binary_archive(self, name):
+        self.verts, self.data = readTargetFile(name)
+
+    def _load_binary_pack(self, name):
         name = name.replace('\\', '/')
-        bname = os.path.splitext(name)[0]
-        iname = '%s.index' % bname
-        vname = '%s.vector' % bname
-        if Target.npztime < os.path.getmtime(name):
-            log.message('compiled file newer than archive: %s', name)
-            raise RuntimeError()
-        if iname not in Target.npzfile:
-            log.message('compiled file missing: %s', iname)
+        if name not in Target.pack:
+            log.message('compiled file missing: %s', name)
             raise RuntimeError()
-        if vector not in Target.npzfile:
-            log.message('compiled file missing: %s', vname)
+        if os.path.isfile(name) and os.path.getmtime(name) > Target.pack.time:
+            log.message('compiled file newer than pack: %s', name)
             raise RuntimeError()
-        self.verts = Target.npzfile[iname]
-        self.data = Target.npzfile[vname] * 1e-3
+        self.verts, vector = Target.pack[name]
+        self._setVector(vector)
+        if Target.pack.topology is not None:
+            self.faces = Target.pack.getFaces(name)
 
     def _load_binary_files(self, name):
         bname = os.path.splitext(name)[0]
@@ -132,28 +531,32 @@ class Target:
         if not os.path.exists(vname):
             log.message('compiled file missing: %s', name)
             raise RuntimeError()
-        if os.path.getmtime(iname) < path.getmtime(name):
+        if os.path.getmtime(iname) < os.path.getmtime(name):
             log.message('compiled file out of date: %s', iname)
             raise RuntimeError()
-        if os.path.getmtime(vname) < path.getmtime(name):
+        if os.path.getmtime(vname) < os.path.getmtime(name):
             log.message('compiled file out of date: %s', vname)
             raise RuntimeError()
         self.verts = np.load(iname)
-        self.data = np.load(vname) * 1e-3
+        self._setVector(np.load(vname))
 
     def _load_binary(self, name):
-        if Target.npzfile is None:
+        if Target.pack is None:
             try:
-                npzname = 'data/targets.npz'
-                Target.npzfile = np.load(npzname)
-                Target.npztime = os.path.getmtime(npzname)
-            except:
-                log.message('no compressed targets found')
-                Target.npzfile = False
-        if Target.npzfile == False:
+                Target.pack = TargetPack(Target.packPath, Target.packTablePath)
+            except StandardError:
+                log.message('no compiled targets found')
+                Target.pack = False
+        if Target.pack is False:
             self._load_binary_files(name)
         else:
-            self._load_binary_archive(name)
+            self._load_binary_pack(name)
+
+    def _compile(self):
+        if self.vector is not None:
+            index = np.ascontiguousarray(self.verts, dtype=np.uint16)
+            return index, np.ascontiguousarray(self.vector, dtype=np.int16)
+        return quantizeTarget(self.verts, self._data)
 
     def _save_binary(self, name):
         log.message('compiling %s', name)
@@ -161,8 +564,7 @@ class Target:
             bname, ext = os.path.splitext(name)
             iname = '%s.index.npy' % bname
             vname = '%s.vector.npy' % bname
-            index = np.ascontiguousarray(self.verts, dtype=np.uint16)
-            vector = np.ascontiguousarray(np.round(self.data * 1e3), dtype=np.int16)
+            index, vector = self._compile()
             np.save(iname, index)
             np.save(vname, vector)
             return iname, vname
@@ -174,6 +576,8 @@ class Target:
             self._load_binary(name)
         except StandardError, e:
             self._load_text(name)
+            if Target.quantize:
+                self._setVector(self._compile()[1])
 
     def apply(self, obj, morphFactor, update=True, calcNormals=True, faceGroupToUpdateName=None, scale=(1.0,1.0,1.0)):
         self.morphFactor = morphFactor                
@@ -201,8 +605,8 @@ class Target:
             if morphFactor:
                 # Adding the translation vector
 
-                scale = np.array(scale) * morphFactor
-                obj.coord[dstVerts] += self.data[srcVerts] * scale[None,:]
+                scale = np.array(scale, dtype=np.float32) * morphFactor
+                obj.coord[dstVerts] += self.getScaled(scale[None,:], srcVerts)
                 obj.markCoords(dstVerts, coor=True)
 
             if calcNormals:
@@ -214,6 +618,485 @@ class Target:
             
         return False
 
+class MorphEngine(object):
+
+    """
+    This class stacks the translation vectors of all targets used on a mesh
+    into a single sparse morph matrix, so that a complete set of target
+    weights can be applied with one sparse matrix-vector product instead of
+    one call to Target.apply per target.
+
+    The matrix is stored in compressed sparse row (CSR) form, with one row
+    per base vertex and one column per target. Each stored element is the
+    3d translation vector of a target for a vertex. Targets are added as
+    columns when they are first used, and the CSR arrays are rebuilt lazily
+    the next time the matrix is needed.
+
+    Warp targets are regenerated whenever the character changes, so they are
+    not stacked into the matrix but applied separately. The translations
+    applied for each warp target are kept, so that they can be taken back
+    when its value changes or when it is regenerated or dropped.
+
+    Translations made to the object which do not come from a target, such as
+    those of Human.mirrorMesh, are kept as a correction of the base
+    coordinates, so that they are not lost when the object is rebuilt.
+
+    The weights last applied to the object are kept, so that a following
+    call to apply only needs to add the translations of the targets whose
+    weight changed. After rebaseInterval incremental updates, or when the
+    coordinates of the object were changed by anything else, the object is
+    rebuilt from its base coordinates so that rounding errors do not add up.
+    """
+
+    rebaseInterval = 64
+    batchSize = 1 << 24
+
+    def __init__(self, obj):
+        """
+        This method initializes an instance of the MorphEngine class.
+
+        Parameters
+        ----------
+
+        obj:
+            *3d object*. The base object to which the targets are applied.
+        """
+
+        self.obj = obj
+        self.nverts = len(obj.orig_coord)
+        self.columns = {}
+        self.targets = []
+        self.pending = []
+        self.removed = []
+
+        self.indptr = np.zeros(self.nverts + 1, dtype=np.uint32)
+        self.indices = np.zeros(0, dtype=np.uint32)
+        self.data = np.zeros((0, 3), dtype=Target.quantize and np.int16 or np.float32)
+        self.rows = np.zeros(0, dtype=np.uint32)
+        self.starts = np.zeros(0, dtype=np.uint32)
+
+        self.basis = None
+
+        self.applied = None
+        self.warps = {}
+        self.correction = None
+        self.version = None
+        self.updates = 0
+
+        targetBuffer.addListener(self)
+
+    def addTarget(self, targetPath):
+        """
+        Returns the matrix column of a target, adding the target to the
+        matrix if it is not part of it yet. Returns None for warp targets.
+        """
+
+        col = self.columns.get(targetPath)
+        if col is not None:
+            return col
+
+        target = getTarget(self.obj, targetPath)
+        if hasattr(target, 'isWarp'):
+            return None
+
+        col = len(self.targets)
+        self.columns[targetPath] = col
+        self.targets.append(target)
+        self.pending.append(col)
+        return col
+
+    def removeTarget(self, targetPath):
+        """
+        Drops a target from the matrix. This is called by the target cache
+        when the target is evicted. The column is removed from the CSR
+        arrays by the next call to compact.
+        """
+
+        col = self.columns.pop(targetPath, None)
+        if col is None:
+            return
+        self.targets[col] = None
+        self.removed.append(col)
+
+    def getRows(self):
+        return np.repeat(np.arange(self.nverts, dtype=np.uint32), np.diff(self.indptr))
+
+    def setRows(self, rows):
+        counts = np.bincount(rows, minlength=self.nverts)
+        self.indptr = np.zeros(self.nverts + 1, dtype=np.uint32)
+        np.cumsum(counts, out=self.indptr[1:])
+
+        # Rows without any entries are skipped by the product
+        self.rows = np.argwhere(counts)[...,0].astype(np.uint32)
+        self.starts = self.indptr[self.rows]
+
+    def compact(self):
+        """
+        Removes the columns of dropped targets from the matrix and renumbers
+        the remaining ones.
+        """
+
+        if not self.removed:
+            return
+
+        alive = np.array([target is not None for target in self.targets], dtype=bool)
+        remap = (np.cumsum(alive) - 1).astype(np.uint32)
+
+        entries = alive[self.indices]
+        rows = self.getRows()[entries]
+        self.indices = remap[self.indices[entries]]
+        self.data = self.data[entries]
+        del entries
+        self.setRows(rows)
+        self.basis = None
+        del rows
+
+        self.columns = dict((path, int(remap[col])) for path, col in self.columns.iteritems())
+        self.pending = [int(remap[col]) for col in self.pending if alive[col]]
+        if self.applied is not None:
+            self.applied = self.applied[alive[:len(self.applied)]]
+        self.targets = [target for target in self.targets if target is not None]
+        self.removed = []
+
+    def build(self):
+        """
+        Merges the targets added since the last call into the CSR arrays.
+        """
+
+        if not self.pending:
+            return
+
+        # The matrix is kept quantized if the targets are
+        quantized = Target.quantize
+        if quantized != (self.data.dtype == np.int16):
+            if quantized:
+                self.data = np.round(self.data / Target.quantum).astype(np.int16)
+            else:
+                self.data = self.data * Target.quantum
+
+        rows = [self.getRows()]
+        cols = [self.indices]
+        data = [self.data]
+        for col in self.pending:
+            target = self.targets[col]
+            if target is None or not len(target.verts):
+                continue
+            rows.append(np.asarray(target.verts, dtype=np.uint32))
+            cols.append(np.repeat(np.uint32(col), len(target.verts)))
+            if quantized:
+                data.append(target._compile()[1])
+            else:
+                data.append(np.asarray(target.data, dtype=np.float32))
+        self.pending = []
+
+        rows = np.concatenate(rows)
+        order = np.argsort(rows, kind='mergesort')
+        self.indices = np.concatenate(cols)[order]
+        self.data = np.concatenate(data)[order]
+        self.setRows(rows[order])
+        self.basis = None
+        del rows, order
+
+    def getWeights(self, details):
+        """
+        Builds the weight vector for a dictionary of target paths and values,
+        as stored in Human.targetsDetailStack.
+
+        Returns the weight vector and a list of (path, value) pairs for the
+        targets which are not part of the matrix.
+        """
+
+        self.compact()
+        targetBuffer.pin(self, details)
+
+        extra = []
+        cols = []
+        values = []
+        for targetPath, morphFactor in details.iteritems():
+            col = self.addTarget(targetPath)
+            if col is None:
+                extra.append((targetPath, morphFactor))
+            else:
+                cols.append(col)
+                values.append(morphFactor)
+
+        weights = np.zeros(len(self.targets), dtype=np.float32)
+        weights[cols] = values
+        return weights, extra
+
+    def morph(self, weights):
+        """
+        Returns the combined translation of all vertices for a weight vector,
+        as an array of shape (nverts, 3).
+        """
+
+        self.build()
+
+        if self.data.dtype == np.int16:
+            weights = weights * Target.quantum
+
+        delta = np.zeros((self.nverts, 3), dtype=np.float32)
+        if len(self.indices):
+            weighted = self.data * weights[self.indices][:,None]
+            delta[self.rows] = np.add.reduceat(weighted, self.starts, axis=0)
+        return delta
+
+    def morphBatch(self, details):
+        """
+        Returns the coordinates of several morphs of the object at once, as
+        a float32 array of shape (n, nverts, 3).
+
+        Parameters
+        ----------
+
+        details:
+            *dictionary*. Target paths and arrays of n values, one per morph.
+        """
+
+        self.compact()
+        targetBuffer.pin(self, details)
+
+        n = max([len(values) for values in details.itervalues()] + [0])
+        cols = []
+        values = []
+        for targetPath, morphFactors in details.iteritems():
+            col = self.addTarget(targetPath)
+            if col is None:
+                log.warning('cannot apply %s to a batch', targetPath)
+                continue
+            cols.append(col)
+            values.append(morphFactors)
+        self.build()
+
+        weights = np.zeros((n, len(self.targets)), dtype=np.float32)
+        if cols:
+            weights[:,cols] = np.transpose(values)
+
+        coords = np.empty((n, self.nverts, 3), dtype=np.float32)
+        coords[...] = self.obj.orig_coord
+        if not len(self.indices):
+            return coords
+
+        basis = self.getBasis()
+        if basis is not None:
+            # Dense product over the rows which have entries
+            coords[:,self.rows] += np.dot(weights, basis).reshape(n, -1, 3)
+            return coords
+
+        if self.data.dtype == np.int16:
+            weights *= Target.quantum
+
+        # Bound the size of the (morphs, entries) temporaries
+        step = max(1, self.batchSize // len(self.indices))
+        for start in xrange(0, n, step):
+            chunk = weights[start:start+step][:,self.indices]
+            for axis in xrange(3):
+                weighted = chunk * self.data[:,axis]
+                coords[start:start+step,self.rows,axis] += np.add.reduceat(weighted, self.starts, axis=1)
+        return coords
+
+    def getBasis(self):
+        """
+        Returns the matrix as a dense float32 array of shape (targets,
+        rows * 3), limited to the rows which have entries, or None if that
+        array would hold more than batchSize values.
+        """
+
+        if self.basis is None:
+            if len(self.targets) * len(self.rows) * 3 > self.batchSize:
+                return None
+            counts = np.diff(np.append(self.starts, len(self.indices)))
+            rows = np.repeat(np.arange(len(self.rows)), counts)
+            basis = np.zeros((len(self.targets), len(self.rows), 3), dtype=np.float32)
+            basis[self.indices, rows] = self.data
+            if self.data.dtype == np.int16:
+                basis *= Target.quantum
+            self.basis = basis.reshape(len(self.targets), -1)
+        return self.basis
+
+    def rebase(self, details):
+        """
+        Resets the object to its base coordinates and applies the targets in
+        a dictionary of target paths and values.
+        """
+
+        weights, extra = self.getWeights(details)
+        self._rebase(weights, extra)
+
+    def _rebase(self, weights, extra):
+        coord = self.obj.orig_coord + self.morph(weights)
+
+        self.warps = {}
+        for targetPath, morphFactor in extra:
+            self.addWarp(coord, targetPath, getTarget(self.obj, targetPath), morphFactor)
+        if self.correction is not None:
+            coord += self.correction
+        self.obj.changeCoords(coord)
+
+        self.applied = weights
+        self.version = self.obj.coordVersion
+        self.updates = 0
+
+    def addWarp(self, coord, targetPath, target, morphFactor):
+        """
+        Adds the translations of a warp target to coord and records them as
+        applied. Returns the indices of the vertices which were moved.
+        """
+
+        target.morphFactor = morphFactor
+        verts = np.asarray(target.verts, dtype=np.uint32)
+        if len(verts):
+            delta = target.getScaled(morphFactor)
+            coord[verts] += delta
+        else:
+            delta = np.zeros((0, 3), dtype=np.float32)
+        self.warps[targetPath] = (target, self.getWarpSource(target), morphFactor, verts, delta)
+        return verts
+
+    def removeWarp(self, coord, targetPath):
+        """
+        Takes the translations last applied for a warp target back out of
+        coord. Returns the indices of the vertices which were moved.
+        """
+
+        target, source, morphFactor, verts, delta = self.warps.pop(targetPath)
+        coord[verts] -= delta
+        return verts
+
+    @staticmethod
+    def getWarpSource(target):
+        return target._data if target.vector is None else target.vector
+
+    def setCorrection(self, correction):
+        """
+        Replaces the correction of the base coordinates. The object is
+        rebuilt by the next call to apply.
+
+        Parameters
+        ----------
+
+        correction:
+            *float array* of shape (nverts, 3), or None for no correction.
+        """
+
+        self.correction = correction
+        self.applied = None
+
+    def addCorrection(self, verts, delta):
+        """
+        Records translations which were added to the coordinates of the
+        object outside the engine, so that they are kept when the object is
+        rebuilt. The vertices are marked as changed.
+
+        Parameters
+        ----------
+
+        verts:
+            *array*. The indices of the moved vertices.
+
+        delta:
+            *float array* of shape (n, 3). The translations of the vertices.
+        """
+
+        if self.correction is None:
+            self.correction = np.zeros((self.nverts, 3), dtype=np.float32)
+        self.correction[verts] += delta
+
+        synced = self.version == self.obj.coordVersion
+        self.obj.markCoords(verts, coor=True)
+        if synced:
+            self.version = self.obj.coordVersion
+
+    def invalidate(self):
+        """
+        Forgets the applied weights, so that the next call to apply rebuilds
+        the object from its base coordinates.
+        """
+
+        self.applied = None
+
+    def apply(self, details, blend=None):
+        """
+        Brings the object in line with a dictionary of target paths and
+        values, adding only the translations of the targets whose value
+        changed since the last call.
+
+        blend is an optional tuple (paths, old weights, new weights, vertex
+        indices, delta), as returned by humanmodifier.MacroBasis.getBlend:
+        the translation delta of the given vertices replaces the updates of
+        the targets in paths, provided their applied and new weights match
+        the given ones.
+
+        Returns the indices of the vertices which were moved, or None if the
+        object was rebuilt from its base coordinates.
+        """
+
+        weights, extra = self.getWeights(details)
+
+        if (self.removed or
+            self.applied is None or
+            self.version != self.obj.coordVersion or
+            self.updates >= self.rebaseInterval):
+            self._rebase(weights, extra)
+            return None
+
+        applied = np.zeros(len(weights), dtype=np.float32)
+        applied[:len(self.applied)] = self.applied
+
+        coord = self.obj.coord
+        verts = []
+        if blend is not None:
+            paths, old, new, bverts, delta = blend
+            cols = np.array([self.columns.get(path, -1) for path in paths], dtype=np.intp)
+            known = cols >= 0
+            current = np.zeros(len(paths))
+            current[known] = applied[cols[known]]
+            target = np.zeros(len(paths))
+            target[known] = weights[cols[known]]
+            if np.allclose(current, old, atol=1e-6) and np.allclose(target, new, atol=1e-6):
+                applied[cols[known]] = weights[cols[known]]
+                coord[bverts] += delta
+                verts.append(bverts)
+
+        # A warp target is updated when its value changed, or when it was
+        # regenerated, which replaces its arrays
+        warps = {}
+        for targetPath, morphFactor in extra:
+            target = getTarget(self.obj, targetPath)
+            last = self.warps.get(targetPath)
+            if (last is None or last[0] is not target or
+                last[1] is not self.getWarpSource(target) or last[2] != morphFactor):
+                warps[targetPath] = (target, morphFactor)
+        stale = [targetPath for targetPath in self.warps
+                 if targetPath in warps or targetPath not in details]
+
+        changed = np.argwhere(weights != applied)[...,0]
+        targets = [self.targets[col] for col in changed]
+        count = sum(len(target.verts) for target in targets)
+        count += sum(len(self.warps[targetPath][3]) for targetPath in stale)
+        count += sum(len(target.verts) for target, morphFactor in warps.itervalues())
+        if count * 2 > len(self.indices):
+            # Cheaper to redo the product
+            self._rebase(weights, extra)
+            return None
+
+        for col, target in zip(changed, targets):
+            if not len(target.verts):
+                continue
+            coord[target.verts] += target.getScaled(weights[col] - applied[col])
+            verts.append(target.verts)
+        for targetPath in stale:
+            verts.append(self.removeWarp(coord, targetPath))
+        for targetPath, (target, morphFactor) in warps.iteritems():
+            verts.append(self.addWarp(coord, targetPath, target, morphFactor))
+        verts = np.unique(np.concatenate(verts)) if verts else np.zeros(0, dtype=np.uint32)
+
+        self.obj.markCoords(verts, coor=True)
+        self.applied = weights
+        self.version = self.obj.coordVersion
+        self.updates += 1
+        return verts
+
 def getTarget(obj, targetPath):
     """
     This function retrieves a set of translation vectors from a morphing 
@@ -261,6 +1144,88 @@ def getTarget(obj, targetPath):
     
     return target
 
+class TargetPrefetcher(object):
+
+    """
+    This class loads targets on a pool of worker threads ahead of their
+    first use, so that the first slider drag does not have to wait for them.
+
+    Loaded targets are handed to a publish function, which adds them to
+    targetBuffer. GUI code passes a function which does this from the main
+    thread. A new request replaces the targets still queued from the
+    previous one.
+    """
+
+    def __init__(self, nthreads=2):
+        self.nthreads = nthreads
+        self.cond = threading.Condition()
+        self.queue = []
+        self.publish = publishTarget
+        self.threads = []
+
+    def prefetch(self, obj, paths, publish=None):
+        """
+        Queues the targets with the given paths for loading.
+
+        Parameters
+        ----------
+
+        obj:
+            *3d object*. The base object of the targets.
+
+        paths:
+            *list of strings*. The paths of the targets to load.
+
+        publish:
+            *function*. Called with the path and the loaded target, defaults
+            to publishTarget.
+        """
+
+        paths = [path for path in paths if path not in targetBuffer]
+        with self.cond:
+            self.queue = [(obj, path) for path in reversed(paths)]
+            self.publish = publish or publishTarget
+            self.cond.notifyAll()
+
+        while len(self.threads) < self.nthreads:
+            thread = threading.Thread(target=self._run, name='TargetPrefetcher')
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def cancel(self):
+        """
+        Drops the targets which are still queued.
+        """
+
+        with self.cond:
+            self.queue = []
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+                obj, path = self.queue.pop()
+                publish = self.publish
+            if path in targetBuffer:
+                continue
+            try:
+                publish(path, Target(obj, path))
+            except StandardError:
+                log.warning('failed to prefetch %s', path, exc_info=True)
+
+def publishTarget(path, target):
+    """
+    Adds a prefetched target to targetBuffer, unless the target has been
+    loaded in the meantime.
+    """
+
+    if path not in targetBuffer:
+        targetBuffer[path] = target
+
+prefetcher = TargetPrefetcher()
+
 def loadTranslationTarget(obj, targetPath, morphFactor, faceGroupToUpdateName=None, update=1, calcNorm=1, scale=[1.0,1.0,1.0]):
     """
     This function retrieves a set of translation vectors and applies those 
@@ -50,10 +50,21 @@ The dataTo3Dobject() function can then be used to convert it into an object that
 is visible to the user through the GUI.
 """
 
-import os.path
+import os
+import time
+import hashlib
 import module3d
 import numpy as np
 import log
+from getpath import getPath
+
+# Directory of the compiled copies of the meshes loaded by loadMesh, None
+# for the default (meshes in the user cache directory)
+cacheDir = None
+
+# Compiled copies which have not been used for this many seconds are removed
+# when a new one is written
+cacheMaxAge = 30 * 24 * 3600
 
 def packStringList(strings):
     text = ''
@@ -79,14 +90,12 @@ def unpackStringList(text, index):
 
     return strings
 
-def saveBinaryMesh(obj, path):
+def saveBinaryMesh(obj, path, source=None):
     fgstr, fgidx = packStringList(fg.name for fg in obj._faceGroups)
     mtlstr, mtlidx = packStringList(obj._materials)
 
     vars = dict(
         coord = obj.coord,
-        vface = obj.vface,
-        nfaces = obj.nfaces,
         texco = obj.texco,
         fvert = obj.fvert,
         group = obj.group,
@@ -99,12 +108,33 @@ def saveBinaryMesh(obj, path):
     if obj.has_uv:
         vars['fuvs']  = obj.fuvs
 
+    if obj.getFaceCount():
+        vars['vfaceIndptr'] = obj.vfaceIndptr
+        vars['vfaceIndices'] = obj.vfaceIndices
+
+    # The size and mtime of the OBJ file, for cached copies
+    if source is not None:
+        vars['source'] = np.array(source, dtype=np.float64)
+
     np.savez(path, **vars)
 
-def loadBinaryMesh(obj, path):
+def loadBinaryMesh(obj, path, source=None):
     log.debug('loadBinaryMesh: np.load()')
 
     npzfile = np.load(path)
+    try:
+        _loadBinaryMesh(obj, npzfile, source)
+    finally:
+        npzfile.close()
+
+def _loadBinaryMesh(obj, npzfile, source):
+    # A cached copy must have been made from an OBJ file of the given size
+    # and mtime
+    if source is not None:
+        if 'source' not in npzfile.files:
+            raise RuntimeError('compiled mesh has no source')
+        if tuple(npzfile['source']) != tuple(np.array(source, dtype=np.float64)):
+            raise RuntimeError('compiled mesh out of date')
 
     log.debug('loadBinaryMesh: loading arrays')
     coord = npzfile['coord']
@@ -117,10 +147,13 @@ def loadBinaryMesh(obj, path):
     fuvs = npzfile['fuvs'] if 'fuvs' in npzfile.files else None
     group = npzfile['group']
     fmtls = npzfile['fmtls']
-    obj.setFaces(fvert, fuvs, group, fmtls, skipUpdate=True)
-
-    obj.vface = npzfile['vface']
-    obj.nfaces = npzfile['nfaces']
+    if 'vfaceIndptr' in npzfile.files:
+        obj.setFaces(fvert, fuvs, group, fmtls, skipUpdate=True)
+        obj.vfaceIndptr = npzfile['vfaceIndptr']
+        obj.vfaceIndices = npzfile['vfaceIndices']
+        obj.vface, obj.nfaces = module3d.denseAdjacency(obj.vfaceIndptr, obj.vfaceIndices)
+    else:
+        obj.setFaces(fvert, fuvs, group, fmtls)
 
     log.debug('loadBinaryMesh: loaded arrays')
 
@@ -232,6 +265,60 @@ def loadTextMesh(obj, path):
 
     log.debug('loadTextMesh: end')
 
+def getSource(path):
+    """
+    Returns the size and mtime of a file, which key its compiled copy in the
+    cache.
+    """
+    return os.path.getsize(path), os.path.getmtime(path)
+
+def getCachePath(path):
+    """
+    Returns the path of the compiled copy of an OBJ file in the cache
+    directory. There is one copy per OBJ file, named after its absolute path.
+    """
+    folder = cacheDir or os.path.join(getPath('cache'), 'meshes')
+    key = hashlib.md5(os.path.abspath(path)).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(folder, '%s-%s.npz' % (name, key))
+
+def pruneCache(folder, keep, maxAge=None, maxSize=None):
+    """
+    Removes the .npz files of a cache directory which have not been used
+    for maxAge seconds (cacheMaxAge by default), except keep. A file is
+    marked as used by setting its mtime when it is loaded.
+
+    If maxSize is given, the least recently used files are also removed
+    until the remaining ones take at most maxSize bytes.
+    """
+    if maxAge is None:
+        maxAge = cacheMaxAge
+    limit = time.time() - maxAge
+    entries = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if not name.endswith('.npz') or path == keep:
+            continue
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime < limit:
+                os.remove(path)
+            else:
+                entries.append((mtime, os.path.getsize(path), path))
+        except OSError:
+            pass
+
+    if maxSize is None:
+        return
+    total = os.path.getsize(keep) if os.path.isfile(keep) else 0
+    for mtime, size, path in sorted(entries, reverse=True):
+        total += size
+        if total > maxSize:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
 def loadMesh(path, locX=0, locY=0, locZ=0, loadColors=1):
     """
     This function loads the specified mesh object into internal MakeHuman data 
@@ -265,18 +352,34 @@ def loadMesh(path, locX=0, locY=0, locZ=0, loadColors=1):
         npzpath = os.path.splitext(path)[0] + '.npz'
         try:
             if not os.path.isfile(npzpath):
-                log.message('compiled file missing: %s', npzpath)
+                log.debug('compiled file missing: %s', npzpath)
                 raise RuntimeError()
             if os.path.isfile(path) and os.path.getmtime(path) > os.path.getmtime(npzpath):
                 log.message('compiled file out of date: %s', npzpath)
                 raise RuntimeError()
             loadBinaryMesh(obj, npzpath)
         except:
-            loadTextMesh(obj, path)
+            source = getSource(path)
+            cachepath = getCachePath(path)
             try:
-                saveBinaryMesh(obj, npzpath)
-            except StandardError:
-                log.notice('unable to save compiled mesh: %s', npzpath)
+                if not os.path.isfile(cachepath):
+                    raise RuntimeError()
+                loadBinaryMesh(obj, cachepath, source)
+            except:
+                loadTextMesh(obj, path)
+                try:
+                    folder = os.path.dirname(cachepath)
+                    if not os.path.isdir(folder):
+                        os.makedirs(folder)
+                    saveBinaryMesh(obj, cachepath, source)
+                    pruneCache(folder, cachepath)
+                except StandardError:
+                    log.notice('unable to save compiled mesh: %s', cachepath)
+            else:
+                try:
+                    os.utime(cachepath, None)
+                except OSError:
+                    pass
     except:
         log.error('Unable to load obj file: %s', path, exc_info=True)
         return False
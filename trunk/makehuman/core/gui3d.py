@@ -29,288 +29,9 @@ import weakref
 import events3d
 import module3d
 import mh
-import files3d
-import catmull_clark_subdivision as cks
 import log
 import selection
-import object3d
-
-# Wrapper around Object3D
-class Object(events3d.EventHandler):
-
-    """
-    An object on the screen.
-    
-    :param position: The position in 3d space.
-    :type position: list or tuple
-    :param mesh: The mesh object.
-    :param visible: Wether the object should be initially visible.
-    :type visible: Boolean
-    """
-
-    def __init__(self, position, mesh, visible=True):
-        
-        if mesh.object:
-            raise RuntimeException('This mesh is already attached to an object')
-                
-        self.mesh = mesh
-        self.mesh.setLoc(*position)
-        self.mesh.object = self
-        self.mesh.setVisibility(visible)
-        
-        self._view = None
-        
-        self.visible = visible
-        
-        self.proxy = None
-        
-        self.__seedMesh = self.mesh
-        self.__proxyMesh = None
-        self.__subdivisionMesh = None
-        self.__proxySubdivisionMesh = None
-        
-    def _attach(self):
-    
-        if self._view().isVisible() and self.visible:
-            self.mesh.setVisibility(1)
-        else:
-            self.mesh.setVisibility(0)
-
-        for mesh in self._meshes():
-            self.attachMesh(mesh)
-            
-    def _detach(self):
-        for mesh in self._meshes():
-            self.detachMesh(mesh)
-
-    @staticmethod
-    def attachMesh(mesh):
-        selection.selectionColorMap.assignSelectionID(mesh)
-        object3d.Object3D.attach(mesh)
-
-    @staticmethod
-    def detachMesh(mesh):
-        object3d.Object3D.detach(mesh)
-
-    def _meshes(self):
-        for mesh in (self.__seedMesh,
-                     self.__proxyMesh,
-                     self.__subdivisionMesh,
-                     self.__proxySubdivisionMesh):
-            if mesh is not None:
-                yield mesh
-
-    @property
-    def view(self):
-        return self._view()
-
-    def show(self):
-        
-        self.visible = True
-        self.setVisibility(True)
-
-    def hide(self):
-
-        self.visible = False
-        self.setVisibility(False)
-
-    def isVisible(self):
-        return self.visible
-        
-    def setVisibility(self, visibility):
-
-        if self._view().isVisible() and self.visible and visibility:
-            self.mesh.setVisibility(1)
-        else:
-            self.mesh.setVisibility(0)
-
-    def getPosition(self):
-        return [self.mesh.x, self.mesh.y, self.mesh.z]
-
-    def setPosition(self, position):
-        for mesh in self._meshes():
-            mesh.setLoc(position[0], position[1], position[2])
-
-    def getRotation(self):
-        return [self.mesh.rx, self.mesh.ry, self.mesh.rz]
-
-    def setRotation(self, rotation):
-        for mesh in self._meshes():
-            mesh.setRot(rotation[0], rotation[1], rotation[2])
-            
-    def setScale(self, scale, scaleY=None, scaleZ=1):
-        if scaleY is None:
-            scaleY = scale
-        for mesh in self._meshes():
-            mesh.setScale(scale, scaleY, scaleZ)
-
-    def setTexture(self, texture):
-        if texture:
-            for mesh in self._meshes():
-                mesh.setTexture(texture)
-        else:
-            self.clearTexture()
-            
-    def getTexture(self):
-        return self.__seedMesh.texture
-
-    def clearTexture(self):
-        for mesh in self._meshes():
-            mesh.clearTexture()
-            
-    def hasTexture(self):
-        return self.__seedMesh.hasTexture()
-        
-    def setSolid(self, solid):
-        for mesh in self._meshes():
-            mesh.setSolid(solid)
-            
-    def isSolid(self):
-        return self.__seedMesh.solid
-        
-    def getSeedMesh(self):
-        return self.__seedMesh
-        
-    def getProxyMesh(self):
-        return self.__proxyMesh
-        
-    def updateProxyMesh(self):
-    
-        if self.proxy and self.__proxyMesh:
-            self.proxy.update(self.__proxyMesh, self.__seedMesh)
-            self.__proxyMesh.update()
-        
-    def isProxied(self):
-    
-        return self.mesh == self.__proxyMesh or self.mesh == self.__proxySubdivisionMesh
-        
-    def setProxy(self, proxy):
-    
-        if self.proxy:
-        
-            self.proxy = None
-            self.__proxyMesh.clear()
-            self.__proxyMesh = None
-            if self.__proxySubdivisionMesh:
-                self.__proxySubdivisionMesh.clear()
-                self.__proxySubdivisionMesh = None
-            self.mesh = self.__seedMesh
-            self.mesh.setVisibility(1)
-    
-        if proxy:
-        
-            self.proxy = proxy
-            
-            (folder, name) = proxy.obj_file
-            
-            self.__proxyMesh = files3d.loadMesh(os.path.join(folder, name))
-            for attr in ('x', 'y', 'z', 'rx', 'ry', 'rz', 'sx', 'sy', 'sz',
-                         'visibility', 'shadeless', 'pickable', 'cameraMode', 'texture'):
-                setattr(self.__proxyMesh, attr, getattr(self.mesh, attr))
-            
-            self.__proxyMesh.object = self.mesh.object
-            
-            self.proxy.update(self.__proxyMesh, self.__seedMesh)
-            
-            if self.__seedMesh.object3d:
-                self.attachMesh(self.__proxyMesh)
-            
-            self.mesh.setVisibility(0)
-            self.mesh = self.__proxyMesh
-            self.mesh.setVisibility(1)
-            
-    def getSubdivisionMesh(self, update=True, progressCallback=None):
-        """
-        Create or update the Catmull-Clark subdivided (or smoothed) mesh for 
-        this mesh.
-        This does not change the status of isSubdivided(), use setSubdivided()
-        for that.
-
-        If this mesh is doubled by a proxy, when isProxied() is true, a
-        subdivision mesh for the proxy is used.
-
-        Returns the subdivided mesh data.
-
-        """
-        
-        if self.isProxied():
-            if not self.__proxySubdivisionMesh:
-                self.__proxySubdivisionMesh = cks.createSubdivisionObject(self.__proxyMesh, progressCallback)
-                if self.__seedMesh.object3d:
-                    self.attachMesh(self.__proxySubdivisionMesh)
-            elif update:
-                cks.updateSubdivisionObject(self.__proxySubdivisionMesh, progressCallback)
-                
-            return self.__proxySubdivisionMesh
-        else:
-            if not self.__subdivisionMesh:
-                self.__subdivisionMesh = cks.createSubdivisionObject(self.__seedMesh, progressCallback)
-                if self.__seedMesh.object3d:
-                    self.attachMesh(self.__subdivisionMesh)
-            elif update:
-                cks.updateSubdivisionObject(self.__subdivisionMesh, progressCallback)
-                
-            return self.__subdivisionMesh
-
-    def isSubdivided(self):
-        """
-        Returns whether this mesh is currently set to be subdivided 
-        (or smoothed).
-
-        """
-
-        return self.mesh == self.__subdivisionMesh or self.mesh == self.__proxySubdivisionMesh
-            
-    def setSubdivided(self, flag, update=True, progressCallback=None):
-        """
-        Set whether this mesh is to be subdivided (or smoothed).
-        When set to true, the subdivision mesh is automatically created or
-        updated.
-
-        """
-
-        if flag == self.isSubdivided():
-            return
-            
-        if flag:
-            self.mesh.setVisibility(0)
-            self.mesh = self.getSubdivisionMesh(update, progressCallback)
-            self.mesh.setVisibility(1)
-        else:
-            self.mesh.setVisibility(0)
-            self.mesh = self.__seedMesh if self.mesh == self.__subdivisionMesh else self.__proxyMesh
-            if update:
-                self.mesh.calcNormals()
-                self.mesh.update()
-            self.mesh.setVisibility(1)
-            
-    def updateSubdivisionMesh(self):
-    
-        self.getSubdivisionMesh(True)
-            
-    def onMouseDown(self, event):
-        self._view().callEvent('onMouseDown', event)
-
-    def onMouseMoved(self, event):
-        self._view().callEvent('onMouseMoved', event)
-
-    def onMouseDragged(self, event):
-        self._view().callEvent('onMouseDragged', event)
-
-    def onMouseUp(self, event):
-        self._view().callEvent('onMouseUp', event)
-
-    def onMouseEntered(self, event):
-        self._view().callEvent('onMouseEntered', event)
-
-    def onMouseExited(self, event):
-        self._view().callEvent('onMouseExited', event)
-
-    def onClicked(self, event):
-        self._view().callEvent('onClicked', event)
-
-    def onMouseWheel(self, event):
-        self._view().callEvent('onMouseWheel', event)
+from guicommon import Object
 
 class View(events3d.EventHandler):
 
@@ -32,6 +32,7 @@ from core import G
 import mh
 import events3d
 import files3d
+import module3d
 import gui3d
 import animation3d
 import human
@@ -167,7 +168,10 @@ class MHApplication(gui3d.Application, mh.Application):
             'language':'english',
             'excludePlugins':[],
             'rtl': False,
-            'sliderImages': False
+            'sliderImages': False,
+            'targetCacheSize': 0,
+            'quantizeTargets': False,
+            'areaWeightedNormals': False
         }
 
         self.fonts = {}
@@ -550,6 +554,16 @@ class MHApplication(gui3d.Application, mh.Application):
         if 'language' in self.settings:
             self.setLanguage(self.settings['language'])
 
+        # Memory budget of the target cache in MB, 0 means no limit
+        if self.settings['targetCacheSize']:
+            algos3d.targetBuffer.setBudget(self.settings['targetCacheSize'] * 1024 * 1024)
+
+        # Keep the loaded targets as int16, like they are stored on disk
+        algos3d.Target.quantize = self.settings['quantizeTargets']
+
+        # Weight the vertex normals by the area of the faces around them
+        module3d.Object3D.areaWeightedNormals = self.settings['areaWeightedNormals']
+
         gui.Slider.showImages(self.settings['sliderImages'])
 
         with inFile("shortcuts.ini") as f:
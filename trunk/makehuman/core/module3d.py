@@ -24,6 +24,7 @@ TODO
 
 import os
 import weakref
+import hashlib
 
 import numpy as np
 
@@ -82,7 +83,127 @@ class FaceGroup(object):
         for f in np.argwhere(self.object.group == self.idx)[...,0]:
             yield FaceProxy(self.object, f)
 
+def buildAdjacency(elements, count):
+    """
+    Returns the adjacency of count vertices to the rows of elements (an (n, k)
+    array of vertex indices, such as the faces of a mesh) in CSR form: the
+    rows using vertex v are indices[indptr[v]:indptr[v+1]], in increasing
+    order and each listed once.
+
+    :param elements: The vertex indices of the elements.
+    :type elements: numpy.ndarray
+    :param count: The number of vertices.
+    :type count: int
+    :return: The indptr and indices arrays.
+    :rtype: tuple
+    """
+    indptr = np.zeros(count + 1, dtype=np.uint32)
+    n = len(elements)
+    if n == 0:
+        return indptr, np.zeros(0, dtype=np.uint32)
+    elements = np.asarray(elements).reshape(n, -1)
+    rows = np.repeat(np.arange(n, dtype=np.int64), elements.shape[1])
+    keys = np.unique(elements.ravel().astype(np.int64) * n + rows)
+    verts = keys // n
+    np.cumsum(np.bincount(verts, minlength=count), out=indptr[1:])
+    return indptr, (keys - verts * n).astype(np.uint32)
+
+def denseAdjacency(indptr, indices):
+    """
+    Converts a CSR adjacency to a table with one row per vertex, padded with
+    zeros to the highest valence, and the number of valid entries per row.
+    """
+    counts = np.diff(indptr.astype(np.int64))
+    width = max(int(counts.max()) if len(counts) else 0, 1)
+    table = np.zeros((len(counts), width), dtype=np.uint32)
+    rows = np.repeat(np.arange(len(counts)), counts)
+    cols = np.arange(len(indices)) - np.repeat(indptr[:-1].astype(np.int64), counts)
+    table[rows, cols] = indices
+    return table, counts.astype(np.uint32)
+
+def gatherAdjacency(indptr, indices, rows):
+    """
+    Returns the concatenated adjacency lists of some rows of a CSR adjacency,
+    and the length of each list.
+
+    :param rows: The rows, as indices or as a boolean mask.
+    :type rows: numpy.ndarray
+    """
+    rows = np.asarray(rows)
+    if rows.dtype == bool:
+        rows = np.argwhere(rows)[...,0]
+    rows = rows.astype(np.intp).reshape(-1)
+    starts = indptr[rows].astype(np.intp)
+    counts = indptr[rows + 1].astype(np.intp) - starts
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return indices[np.repeat(starts, counts) + offsets], counts
+
+def sumAdjacent(values, indptr, indices, rows=None):
+    """
+    Returns, for each row of a CSR adjacency (or for the given rows only),
+    the sum of the values of its adjacent elements, for instance the sum of
+    the normals of the faces around each vertex.
+    """
+    if rows is None:
+        entries = indices
+        counts = np.diff(indptr.astype(np.intp))
+    else:
+        entries, counts = gatherAdjacency(indptr, indices, rows)
+    result = np.zeros((len(counts),) + values.shape[1:], dtype=values.dtype)
+    used = counts > 0
+    if np.any(used):
+        offsets = np.cumsum(counts) - counts
+        result[used] = np.add.reduceat(values[entries], offsets[used], axis=0)
+    return result
+
+def faceNormals(fvert, areaWeighted=False):
+    """
+    Returns the (unnormalized) normals of faces given by the coordinates of
+    their vertices, an (n, k, 3) array. By default the normal is the cross
+    product of two edges of the first triangle of each face; with
+    areaWeighted, its length is the area of the whole face.
+    """
+    v1 = fvert[:,0,:]
+    v2 = fvert[:,1,:]
+    v3 = fvert[:,2,:]
+    if areaWeighted:
+        # Half the cross product of the diagonals is the vector area of a
+        # quad, also when it is a triangle with a repeated vertex
+        if fvert.shape[1] == 4:
+            return np.cross(v3 - v1, fvert[:,3,:] - v2) / 2
+        return np.cross(v2 - v1, v3 - v1) / 2
+    va = v1 - v2
+    vb = v2 - v3
+    return np.cross(va, vb)
+
+class SyncStats(object):
+    """
+    Counts the render vertices copied by the sync methods of Object3D. The
+    GL module calls endFrame after each redraw, which keeps the counts of
+    that frame in lastFrame.
+    """
+
+    kinds = ('coord', 'norms', 'color', 'texco')
+
+    def __init__(self):
+        self.current = dict.fromkeys(self.kinds, 0)
+        self.lastFrame = dict(self.current)
+
+    def add(self, kind, count):
+        self.current[kind] += count
+
+    def endFrame(self):
+        self.lastFrame = self.current
+        self.current = dict.fromkeys(self.kinds, 0)
+        return self.lastFrame
+
+syncStats = SyncStats()
+
 class Object3D(object):
+    # Whether vertex normals are weighted by the area of the faces around
+    # them, rather than by the area of the first triangle of each face
+    areaWeightedNormals = False
+
     def __init__(self, objName, vertsPerPrimitive=4):
 
         self.name = objName
@@ -106,13 +227,14 @@ class Object3D(object):
         self.object3d = None
         self.vmap = None
         self.tmap = None
+        self.vmapInverse = None
+        self.tmapInverse = None
         self.priority = 0
         self.cull = 0
+        self.coordVersion = 0
 
         self.__object = None
 
-    MAX_FACES = 8
-
     def get_x(self):
         return self.loc[0]
 
@@ -207,24 +329,15 @@ class Object3D(object):
     def calcFaceNormals(self, ix = None):
         if ix is None:
             ix = np.s_[:]
-        fvert = self.coord[self.fvert[ix]]
-        v1 = fvert[:,0,:]
-        v2 = fvert[:,1,:]
-        v3 = fvert[:,2,:]
-        va = v1 - v2
-        vb = v2 - v3
-        self.fnorm[ix] = np.cross(va, vb)
+        self.fnorm[ix] = faceNormals(self.coord[self.fvert[ix]], self.areaWeightedNormals)
 
     def calcVertexNormals(self, ix = None):
-        sync_all = ix is None
         self.markCoords(ix, norm=True)
         if ix is None:
+            norms = sumAdjacent(self.fnorm, self.vfaceIndptr, self.vfaceIndices)
             ix = np.s_[:]
-
-        vface = self.vface[ix]
-        norms = self.fnorm[vface]
-        norms *= np.arange(self.MAX_FACES)[None,:,None] < self.nfaces[ix][:,None,None]
-        norms = np.sum(norms, axis=1)
+        else:
+            norms = sumAdjacent(self.fnorm, self.vfaceIndptr, self.vfaceIndices, ix)
         norms /= np.sqrt(np.sum(norms ** 2, axis=-1))[:,None]
         self.vnorm[ix] = norms
 
@@ -257,7 +370,9 @@ class Object3D(object):
         """
     
         # Clear remote data
-        self.detach()
+        if self.object3d:
+            import object3d
+            object3d.Object3D.detach(self)
 
         self._faceGroups = []
 
@@ -272,6 +387,8 @@ class Object3D(object):
         del self.texco
         del self.vface
         del self.nfaces
+        del self.vfaceIndptr
+        del self.vfaceIndices
 
         del self.ucoor
         del self.unorm
@@ -282,14 +399,18 @@ class Object3D(object):
         self.grpix = None
         self.vmap = None
         self.tmap = None
+        self.vmapInverse = None
+        self.tmapInverse = None
 
     def setCoords(self, coords):
         nverts = len(coords)
         self.coord = np.asarray(coords, dtype=np.float32)
         self.vnorm = np.zeros((nverts, 3), dtype=np.float32)
         self.color = np.zeros((nverts, 4), dtype=np.uint8) + 255
-        self.vface = np.zeros((nverts, self.MAX_FACES), dtype=np.uint32)
-        self.nfaces = np.zeros(nverts, dtype=np.uint8)
+        self.vface = np.zeros((nverts, 1), dtype=np.uint32)
+        self.nfaces = np.zeros(nverts, dtype=np.uint32)
+        self.vfaceIndptr = np.zeros(nverts + 1, dtype=np.uint32)
+        self.vfaceIndices = np.zeros(0, dtype=np.uint32)
 
         self.orig_coord = self.coord.copy()
 
@@ -312,38 +433,37 @@ class Object3D(object):
             indices = np.s_[...]
         return self.vnorm[indices]
 
+    @staticmethod
+    def _markDirty(state, indices):
+        """
+        Adds indices to a dirty state, which is False (clean), True (all
+        dirty) or a list of index arrays.
+        """
+        if state is True or indices is None:
+            return True
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.argwhere(indices)[...,0]
+        if state is False:
+            return [indices.reshape(-1)]
+        state.append(indices.reshape(-1))
+        if len(state) > 32:
+            state[:] = [np.unique(np.concatenate(state))]
+        return state
+
     def markCoords(self, indices = None, coor = False, norm = False, colr = False):
         if isinstance(indices, tuple):
             indices = indices[0]
 
-        nverts = len(self.coord)
-
         if coor:
-            if indices is None:
-                self.ucoor = True
-            else:
-                if self.ucoor is False:
-                    self.ucoor = np.zeros(nverts, dtype=bool)
-                if self.ucoor is not True:
-                    self.ucoor[indices] = True
+            self.coordVersion += 1
+            self.ucoor = self._markDirty(self.ucoor, indices)
 
         if norm:
-            if indices is None:
-                self.unorm = True
-            else:
-                if self.unorm is False:
-                    self.unorm = np.zeros(nverts, dtype=bool)
-                if self.unorm is not True:
-                    self.unorm[indices] = True
+            self.unorm = self._markDirty(self.unorm, indices)
 
         if colr:
-            if indices is None:
-                self.ucolr = True
-            else:
-                if self.ucolr is False:
-                    self.ucolr = np.zeros(nverts, dtype=bool)
-                if self.ucolr is not True:
-                    self.ucolr[indices] = True
+            self.ucolr = self._markDirty(self.ucolr, indices)
 
     def changeCoords(self, coords, indices = None):
         sync_all = indices is None
@@ -372,15 +492,7 @@ class Object3D(object):
         if isinstance(indices, tuple):
             indices = indices[0]
 
-        ntexco = len(self.texco)
-
-        if indices is None:
-            self.utexc = True
-        else:
-            if self.utexc is False:
-                self.utexc = np.zeros(ntexco, dtype=bool)
-            if self.utexc is not True:
-                self.utexc[indices] = True
+        self.utexc = self._markDirty(self.utexc, indices)
 
     def setFaces(self, verts, uvs = None, groups = None, materials = None, skipUpdate = False):
         nfaces = len(verts)
@@ -421,95 +533,139 @@ class Object3D(object):
             indices = np.s_[...]
         return self.fuvs[indices]
 
+    def getTopologyHash(self):
+        """
+        Returns a hash of the vertex count and the face vertex indices of
+        this object. Data computed from the topology of a mesh can be cached
+        under this hash.
+
+        :return: The hash as a hexadecimal string.
+        :rtype: str
+        """
+        md5 = hashlib.md5()
+        md5.update(np.array([len(self.coord), self.vertsPerPrimitive], dtype=np.uint32).tostring())
+        md5.update(np.ascontiguousarray(self.fvert, dtype=np.uint32).tostring())
+        return md5.hexdigest()
+
     def _update_faces(self):
-        for i, f in enumerate(self.fvert):
-            for v in f:
-                if i in self.vface[v,:self.nfaces[v]]:
-                    continue
-                self.vface[v, self.nfaces[v]] = i
-                self.nfaces[v] += 1
-
-    def updateIndexBuffer(self):
-        ngroup = len(self._faceGroups)
+        # The faces of vertex v are vfaceIndices[vfaceIndptr[v]:vfaceIndptr[v+1]];
+        # vface and nfaces hold the same lists as a padded table
+        self.vfaceIndptr, self.vfaceIndices = buildAdjacency(self.fvert, len(self.coord))
+        self.vface, self.nfaces = denseAdjacency(self.vfaceIndptr, self.vfaceIndices)
 
-        group_mask = np.ones(len(self._faceGroups), dtype=bool)
-        for g in self._faceGroups:
-            if 'joint' in g.name or 'helper' in g.name:
-                group_mask[g.idx] = False
+    def updateIndexBuffer(self, indexBuffer=None):
+        """
+        Builds the unwelded render buffers of this object from its faces.
 
-        unwelded = []
-        unwelded_map = {}
-
-        coord = []
-        texco = []
-        index = [[] for g in self._faceGroups]
-
-        for i in xrange(len(self.fvert)):
-            g = self.group[i]
-            if not group_mask[g]:
-                continue
-            verts = []
-            for v, t in zip(self.fvert[i], self.fuvs[i]):
-                p = v, t
-                if p not in unwelded_map:
-                    idx = len(unwelded)
-                    unwelded_map[p] = idx
-                    unwelded.append(p)
-                    coord.append(self.coord[v])
-                    texco.append(self.texco[t])
-                else:
-                    idx = unwelded_map[p]
-                verts.append(idx)
-
-            index[g].append(verts)
-
-        del unwelded_map
-
-        unwelded2 = np.empty((len(unwelded),2), dtype=np.uint32)
-        if unwelded:
-            unwelded2[...] = unwelded
-        self.vmap = unwelded2[:,0]
-        self.tmap = unwelded2[:,1]
-        del unwelded2
-
-        nverts = len(coord)
+        :param indexBuffer: Optional: the arrays returned by getIndexBuffer
+            for an object with the same faces and face groups, which are used
+            instead of being computed again.
+        :type indexBuffer: dict
+        """
+        if indexBuffer is None:
+            self._build_index_buffer()
+        else:
+            self.vmap = indexBuffer['vmap']
+            self.tmap = indexBuffer['tmap']
+            self.vmapInverse = (indexBuffer['vmapIndptr'], indexBuffer['vmapIndices'])
+            self.tmapInverse = (indexBuffer['tmapIndptr'], indexBuffer['tmapIndices'])
+            self.index = indexBuffer['index']
+            self.grpix = indexBuffer['grpix']
+
+        nverts = len(self.vmap)
         self.r_coord = np.empty((nverts, 3), dtype=np.float32)
         self.r_texco = np.empty((nverts, 2), dtype=np.float32)
         self.r_vnorm = np.zeros((nverts, 3), dtype=np.float32)
         self.r_color = np.zeros((nverts, 4), dtype=np.uint8) + 255
 
-        grpix = []
-        allix = []
-        for g, ix in enumerate(index):
-            grpix.append((len(allix), len(ix)))
-            allix.extend(ix)
-        index = allix
-
-        _index = np.empty((len(index), self.vertsPerPrimitive), dtype=np.uint32)
-        if len(index):
-            _index[...] = index
-        self.index = _index
-
-        _grpix = np.empty((len(grpix),2), dtype=np.uint32)
-        if len(grpix):
-            _grpix[...] = grpix
-        self.grpix = _grpix
-
         self.ucoor = True
         self.unorm = True
         self.ucolr = True
         self.utexc = True
         self.sync_all()
 
+    def getIndexBuffer(self):
+        """
+        Returns the arrays computed by updateIndexBuffer, to be cached with
+        the topology of this object.
+
+        :return: The arrays by name.
+        :rtype: dict
+        """
+        return {
+            'vmap': self.vmap,
+            'tmap': self.tmap,
+            'vmapIndptr': self.vmapInverse[0],
+            'vmapIndices': self.vmapInverse[1],
+            'tmapIndptr': self.tmapInverse[0],
+            'tmapIndices': self.tmapInverse[1],
+            'index': self.index,
+            'grpix': self.grpix
+            }
+
+    def _build_index_buffer(self):
+        ngroup = len(self._faceGroups)
+
+        group_mask = np.ones(len(self._faceGroups), dtype=bool)
+        for g in self._faceGroups:
+            if 'joint' in g.name or 'helper' in g.name:
+                group_mask[g.idx] = False
+
+        faces = np.argwhere(group_mask[self.group])[...,0] if len(self.fvert) else np.zeros(0, dtype=np.intp)
+        fvert = self.fvert[faces]
+        fuvs = self.fuvs[faces]
+        groups = self.group[faces]
+
+        # Each distinct (vertex, uv) pair becomes one unwelded vertex,
+        # numbered in order of first use
+        ntexco = int(fuvs.max()) + 1 if fuvs.size else 1
+        keys = fvert.astype(np.int64) * ntexco + fuvs
+        unwelded, first, inverse = np.unique(keys.ravel(), return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty(len(unwelded), dtype=np.uint32)
+        rank[order] = np.arange(len(unwelded), dtype=np.uint32)
+        unwelded = unwelded[order]
+        self.vmap = (unwelded // ntexco).astype(np.uint32)
+        self.tmap = (unwelded % ntexco).astype(np.uint32)
+        del unwelded, first, order
+
+        # The render vertices of each vertex and uv, for partial syncs
+        self.vmapInverse = buildAdjacency(self.vmap[:,None], len(self.coord))
+        self.tmapInverse = buildAdjacency(self.tmap[:,None], len(self.texco))
+
+        # The faces of each group are contiguous, in their original order
+        index = rank[inverse].reshape((len(faces), self.vertsPerPrimitive))
+        self.index = index[np.argsort(groups, kind='mergesort')]
+
+        counts = np.bincount(groups, minlength=ngroup)[:ngroup]
+        self.grpix = np.empty((ngroup, 2), dtype=np.uint32)
+        self.grpix[:,0] = np.cumsum(counts) - counts
+        self.grpix[:,1] = counts
+
+    def _sync(self, state, source, target, map, inverse, kind):
+        """
+        Copies the dirty entries of source to the render array target, through
+        map (vmap or tmap). Only the render vertices of the dirty vertices are
+        copied, found through the inverse of the map.
+        """
+        if state is True:
+            target[...] = source[map]
+            syncStats.add(kind, len(map))
+            return
+        if len(state) == 1:
+            indices = state[0]
+        else:
+            indices = np.unique(np.concatenate(state))
+        rows, counts = gatherAdjacency(inverse[0], inverse[1], indices)
+        target[rows] = source[map[rows]]
+        syncStats.add(kind, len(rows))
+
     def sync_coord(self):
         if self.ucoor is False:
             return
         if self.vmap is None or len(self.vmap) == 0:
             return
-        if self.ucoor is True:
-            self.r_coord[...] = self.coord[self.vmap]
-        else:
-            self.r_coord[self.ucoor[self.vmap]] = self.coord[self.vmap][self.ucoor[self.vmap]]
+        self._sync(self.ucoor, self.coord, self.r_coord, self.vmap, self.vmapInverse, 'coord')
         self.ucoor = False
 
     def sync_norms(self):
@@ -517,10 +673,7 @@ class Object3D(object):
             return
         if self.vmap is None or len(self.vmap) == 0:
             return
-        if self.unorm is True:
-            self.r_vnorm[...] = self.vnorm[self.vmap]
-        else:
-            self.r_vnorm[self.unorm[self.vmap]] = self.vnorm[self.vmap][self.unorm[self.vmap]]
+        self._sync(self.unorm, self.vnorm, self.r_vnorm, self.vmap, self.vmapInverse, 'norms')
         self.unorm = False
 
     def sync_color(self):
@@ -528,10 +681,7 @@ class Object3D(object):
             return
         if self.vmap is None or len(self.vmap) == 0:
             return
-        if self.ucolr is True:
-            self.r_color[...] = self.color[self.vmap]
-        else:
-            self.r_color[self.ucolr[self.vmap]] = self.color[self.vmap][self.ucolr[self.vmap]]
+        self._sync(self.ucolr, self.color, self.r_color, self.vmap, self.vmapInverse, 'color')
         self.ucolr = False
 
     def sync_texco(self):
@@ -539,10 +689,7 @@ class Object3D(object):
             return
         if self.tmap is None or len(self.tmap) == 0:
             return
-        if self.utexc is True:
-            self.r_texco[...] = self.texco[self.tmap]
-        else:
-            self.r_texco[self.utexc[self.tmap]] = self.texco[self.tmap][self.utexc[self.tmap]]
+        self._sync(self.utexc, self.texco, self.r_texco, self.tmap, self.tmapInverse, 'texco')
         self.utexc = False
 
     def sync_all(self):
@@ -798,9 +945,7 @@ class Object3D(object):
 
     def getFaceMaskForVertices(self, verts):
         mask = np.zeros(len(self.fvert), dtype = bool)
-        valid = np.arange(self.MAX_FACES)[None,:] < self.nfaces[verts][:,None]
-        vface = self.vface[verts]
-        faces = np.where(valid, vface, vface[:,:1])
+        faces, counts = gatherAdjacency(self.vfaceIndptr, self.vfaceIndices, verts)
         mask[faces] = True
         return mask
 
@@ -0,0 +1,172 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2013
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Mirror maps of symmetric meshes.
+
+A MirrorMap holds, for each vertex of a mesh, the index of its mirror image
+across the YZ plane. With it, any deformation of the mesh (targets, custom
+targets, warps, ...) can be made symmetric with a few array operations,
+without knowing where the deformation came from.
+
+The pairs come from the symmetry files of maketarget (base.sym and
+base.sym.centers), for the vertices they cover, and from the base
+coordinates for the others.
+"""
+
+import os
+import numpy as np
+import log
+
+pairsPath = 'utils/maketarget/base.sym'
+centersPath = 'utils/maketarget/base.sym.centers'
+
+def loadPairs(path):
+    """
+    Returns the vertex pairs of a .sym file as an (n, 2) array, or None if
+    there is no such file.
+    """
+
+    if not os.path.isfile(path):
+        return None
+    return np.loadtxt(path, delimiter=',', dtype=np.int32, ndmin=2)
+
+def loadCenters(path):
+    """
+    Returns the vertex indices of a .sym.centers file, or None if there is
+    no such file.
+    """
+
+    if not os.path.isfile(path):
+        return None
+    return np.loadtxt(path, dtype=np.int32, ndmin=1)
+
+class MirrorMap(object):
+
+    """
+    The mirror images of the vertices of a mesh.
+
+    The left side of the human is on the negative X side of the mesh.
+    Vertices with no mirror image map onto themselves and are left alone.
+    """
+
+    def __init__(self, coord, pairs=None, centers=None, tolerance=1e-3):
+        """
+        This method builds the mirror map of a mesh.
+
+        Parameters
+        ----------
+
+        coord:
+            *array*. The base coordinates of the mesh, which must be symmetric.
+
+        pairs:
+            *array*. Optional: known (left, right) vertex pairs.
+
+        centers:
+            *array*. Optional: known vertices on the plane of symmetry.
+
+        tolerance:
+            *float*. The distance under which two vertices are taken to be
+            mirror images of each other.
+        """
+
+        coord = np.asarray(coord, dtype=np.float64)
+        nverts = len(coord)
+        mirror = np.empty(nverts, dtype=np.int32)
+        mirror.fill(-1)
+
+        if pairs is not None:
+            pairs = pairs[np.all(pairs < nverts, axis=1)]
+            mirror[pairs[:,0]] = pairs[:,1]
+            mirror[pairs[:,1]] = pairs[:,0]
+        if centers is not None:
+            centers = centers[centers < nverts]
+            mirror[centers] = centers
+
+        # Match the remaining vertices on their rounded coordinates. Rounding
+        # is symmetric, so the key of a mirror image is the key with the
+        # sign of X flipped.
+        rest = np.argwhere(mirror < 0)[...,0]
+        if len(rest):
+            keys = np.round(coord[rest] / tolerance).astype(np.int64)
+            lo = keys.min(axis=0)
+            lo[0] = -np.abs(keys[:,0]).max()
+            span = keys.max(axis=0) - lo + 1
+            span[0] = 1 - 2 * lo[0]
+            def pack(keys):
+                keys = keys - lo
+                return (keys[:,0] * span[1] + keys[:,1]) * span[2] + keys[:,2]
+            packed = pack(keys)
+            flipped = keys.copy()
+            flipped[:,0] = -flipped[:,0]
+            flipped = pack(flipped)
+            order = np.argsort(packed)
+            pos = np.clip(np.searchsorted(packed, flipped, sorter=order), 0, len(order) - 1)
+            found = packed[order[pos]] == flipped
+            mirror[rest[found]] = rest[order[pos[found]]]
+
+        missing = mirror < 0
+        if np.any(missing):
+            log.message('%d vertices have no mirror image', np.count_nonzero(missing))
+            mirror[missing] = np.argwhere(missing)[...,0]
+
+        # Unmatched vertices are on neither side nor on the plane, so
+        # symmetrize does not touch them
+        self.mirror = mirror
+        center = (mirror == np.arange(nverts)) & ~missing
+        paired = ~center & ~missing
+        self.centers = np.argwhere(center)[...,0]
+        self.left = np.argwhere(paired & (coord[:,0] < 0))[...,0]
+        self.right = np.argwhere(paired & (coord[:,0] >= 0))[...,0]
+
+    def symmetrize(self, coord, base, direction='r'):
+        """
+        This method makes a deformation symmetric by copying the deformation
+        of one side onto the other, in place. The deformation is the
+        difference between coord and base, so asymmetries of the base mesh
+        itself are kept.
+
+        Returns the indices of the vertices which were changed.
+
+        Parameters
+        ----------
+
+        coord:
+            *array*. The deformed coordinates, which are changed in place.
+
+        base:
+            *array*. The base coordinates.
+
+        direction:
+            *string*. 'r' copies the right side onto the left side, 'l' the
+            left side onto the right side.
+        """
+
+        verts = self.left if direction == 'r' else self.right
+        source = self.mirror[verts]
+        delta = coord[source] - base[source]
+        delta[:,0] = -delta[:,0]
+        coord[verts] = base[verts] + delta
+
+        # Centered vertices can only move in the plane of symmetry
+        coord[self.centers,0] = base[self.centers,0]
+
+        return np.concatenate((verts, self.centers))
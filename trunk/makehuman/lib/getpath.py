@@ -56,6 +56,8 @@ def getPath(type):
             path += u"\\makehuman\\grab\\"
         elif typeStr == "render":
             path += u"\\makehuman\\render\\"
+        elif typeStr == "cache":
+            path += u"\\makehuman\\cache\\"
         elif typeStr == "":
             path += u"\\makehuman\\"
         else:
@@ -76,6 +78,8 @@ def getPath(type):
             path += "/grab/"
         elif typeStr == "render":
             path += "/render/"
+        elif typeStr == "cache":
+            path += "/cache/"
         elif typeStr == "":
             path += "/"
         else:
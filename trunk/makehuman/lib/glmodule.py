@@ -40,6 +40,7 @@ from OpenGL.GL.ARB.texture_multisample import *
 from core import G
 from image import Image
 import matrix
+import module3d
 from debugdump import DebugDump
 import log
 from texture import Texture
@@ -566,3 +567,8 @@ def draw():
             _draw()
     except StandardError:
         log.error('gl.draw', exc_info=True)
+
+    # Render vertices synced for this frame
+    synced = module3d.syncStats.endFrame()
+    if any(synced.itervalues()):
+        log.debug('synced vertices: %s', ', '.join('%s %d' % (kind, synced[kind]) for kind in module3d.syncStats.kinds))
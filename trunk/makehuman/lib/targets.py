@@ -23,8 +23,11 @@ TODO
 """
 
 import os
+import hashlib
+import cPickle as pickle
+import numpy as np
 import log
-import zipfile
+from getpath import getPath
 
 class Component(object):
     _cat_data = [
@@ -91,11 +94,80 @@ class Component(object):
                 self.data['weight'] = 'averageWeight'
 
 class Targets(object):
+    # The classified targets are cached in the user cache directory, one file
+    # per root. It is out of date when one of the sources it was built from
+    # (the directories walked, or the target pack table and images list) has
+    # a different mtime.
+    cacheVersion = 1
+
     def __init__(self, root):
+        self.cachePath = self.getCachePath(root)
         self.targets = []
         self.groups = {}
         self.images = {}
-        self.walk(root, Component())
+        self.sources = []
+        if not self.loadCache(root):
+            self.walk(root, Component())
+            self.saveCache(root)
+
+    @staticmethod
+    def getCachePath(root):
+        key = hashlib.md5(os.path.abspath(root)).hexdigest()[:16]
+        return os.path.join(getPath('cache'), 'targets-%s.cache' % key)
+
+    @staticmethod
+    def getStamps(sources):
+        stamps = {}
+        for path in sources:
+            try:
+                stamps[path] = os.path.getmtime(path)
+            except OSError:
+                stamps[path] = None
+        return stamps
+
+    def loadCache(self, root):
+        try:
+            with open(self.cachePath, 'rb') as f:
+                cache = pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            log.message('compiled file missing: %s', self.cachePath)
+            return False
+        except StandardError, e:
+            log.message('unable to load compiled file %s: %s', self.cachePath, e)
+            return False
+
+        if cache.get('version') != self.cacheVersion or cache.get('root') != root:
+            log.message('compiled file out of date: %s', self.cachePath)
+            return False
+        if self.getStamps(cache['stamps']) != cache['stamps']:
+            log.message('compiled file out of date: %s', self.cachePath)
+            return False
+
+        self.targets = cache['targets']
+        self.groups = cache['groups']
+        self.images = cache['images']
+        self.sources = cache['stamps'].keys()
+        return True
+
+    def saveCache(self, root):
+        # The pack table is always stamped, so that the cache is rebuilt
+        # when it appears or disappears
+        sources = self.sources + ['data/targets.index.npz']
+        cache = dict(
+            version = self.cacheVersion,
+            root = root,
+            stamps = self.getStamps(sources),
+            targets = self.targets,
+            groups = self.groups,
+            images = self.images)
+        try:
+            folder = os.path.dirname(self.cachePath)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            with open(self.cachePath, 'wb') as f:
+                pickle.dump(cache, f, pickle.HIGHEST_PROTOCOL)
+        except StandardError:
+            log.notice('unable to save compiled file: %s', self.cachePath)
 
     @staticmethod
     def is_fake(name, dirs):
@@ -113,6 +185,7 @@ class Targets(object):
         return False
 
     def walk_dirs(self, root, base):
+        self.sources.append(root)
         dirs = os.listdir(root)
         xdirs = [dir.replace('-','_') for dir in dirs]
         for name in sorted(dirs):
@@ -154,14 +227,10 @@ class Targets(object):
                     dir[head] = {}
                 add_file(dir[head], tail)
 
-        with zipfile.ZipFile('data/targets.npz', 'r') as npzfile:
-            for file in npzfile.infolist():
-                name = file.filename
-                if not name.endswith('.index.npy'):
-                    continue
-                name = name[:-10] + '.target'
-                path = name.split('/')
-                add_file(cls._files, path)
+        table = np.load('data/targets.index.npz')
+        for name in table['names']:
+            path = str(name).split('/')
+            add_file(cls._files, path)
 
         with open('data/images.list', 'r') as imgfile:
             for line in imgfile:
@@ -227,7 +296,12 @@ class Targets(object):
         try:
             self.buildTree()
             self.walk_zip(root.split('/'), base)
+            self.sources = ['data/targets.index.npz', 'data/images.list']
         except StandardError:
+            self.targets = []
+            self.groups = {}
+            self.images = {}
+            self.sources = []
             self.walk_dirs(root, base)
 
 _targets = None
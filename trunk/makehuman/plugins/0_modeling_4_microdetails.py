@@ -25,6 +25,7 @@ TODO
 import events3d
 import gui3d
 import humanmodifier
+import guimodifier
 from operator import mul
 from string import Template
 import re
@@ -93,10 +94,6 @@ class DetailTool(events3d.EventHandler):
                 
                 self.before[leftSymmetryTarget] = human.getDetail(leftSymmetryTarget)
                 self.before[rightSymmetryTarget] = human.getDetail(rightSymmetryTarget)
-                
-        if human.isSubdivided():
-            human.meshData.setVisibility(1)
-            human.getSubdivisionMesh(False).setVisibility(0)
 
     def onMouseDragged(self, event):
         if not self.modifier:
@@ -126,10 +123,6 @@ class DetailTool(events3d.EventHandler):
         # Recalculate
 
         human.applyAllTargets(gui3d.app.progress)
-        
-        if human.isSubdivided():
-            human.meshData.setVisibility(0)
-            human.getSubdivisionMesh(False).setVisibility(1)
 
         # Build undo item
 
@@ -138,7 +131,7 @@ class DetailTool(events3d.EventHandler):
         for target in self.before.iterkeys():
             after[target] = human.getDetail(target)
 
-        gui3d.app.did(humanmodifier.DetailAction(human, self.before, after))
+        gui3d.app.did(guimodifier.DetailAction(human, self.before, after))
 
     def onMouseMoved(self, event):
         human = gui3d.app.selectedHuman
@@ -270,10 +263,6 @@ class Detail3dTool(events3d.EventHandler):
     # Recalculate
 
         human.applyAllTargets(gui3d.app.progress)
-        
-        if human.isSubdivided():
-            human.meshData.setVisibility(0)
-            human.getSubdivisionMesh(False).setVisibility(1)
 
     # Add undo item
 
@@ -291,7 +280,7 @@ class Detail3dTool(events3d.EventHandler):
         for target in before.iterkeys():
             after[target] = human.getDetail(target)
 
-        gui3d.app.did(humanmodifier.DetailAction(human, before, after))
+        gui3d.app.did(guimodifier.DetailAction(human, before, after))
 
     def onMouseMoved(self, event):
         human = gui3d.app.selectedHuman
@@ -27,7 +27,6 @@ from math import pi
 import aljabr
 import warp
 import numpy
-import gui3d
 import warpmodifier
 import log
 
@@ -25,7 +25,6 @@ TODO
 
 import module3d
 import aljabr
-import mh
 import mh2bvh
 import os
 import sys
@@ -24,7 +24,8 @@ TODO
 
 import sys
 import os
-import mh
+from getpath import getPath
+import algos3d
 from . import the
 import log
 
@@ -32,7 +33,7 @@ import log
 def listCustomFiles(config):                    
     config.customShapeFiles = []
     if config.customshapes: 
-        folder = os.path.join(mh.getPath(''), 'custom')
+        folder = os.path.join(getPath(''), 'custom')
         readCustomFolder(folder, config)
         
         
@@ -51,18 +52,12 @@ def readCustomFolder(folder, config):
 
 def readCustomTarget(path):
     try:
-        fp = open(path, "rU")
-    except:
+        index, delta = algos3d.readTargetFile(path, extraColumns=True, strict=True)
+    except IOError:
         return []
-    shape = {}
-    for line in fp:
-        words = line.split()
-        try:
-            shape[int(words[0])] = (float(words[1]), float(words[2]), float(words[3]))
-        except:
-            return {}
-    fp.close()
-    return shape
+    except ValueError:
+        return {}
+    return dict(zip(index.tolist(), map(tuple, delta.tolist())))
         
 
 def setupCustomRig(config): 
@@ -28,11 +28,11 @@ BODY_LANGUAGE = True
 
 import module3d
 import aljabr
-import gui3d
 import os
 import time
 import numpy
 import log
+from core import G
 
 #import cProfile
 
@@ -40,7 +40,6 @@ import mh2proxy
 import export_config
 import armature
 import warpmodifier
-import posemode
 import read_expression
 
 from . import the
@@ -62,6 +61,8 @@ the.Human = 'Human'
 #
 
 def exportMhx(human, filename, options):  
+    import posemode
+
     posemode.exitPoseMode()        
     posemode.enterPoseMode()
     config = export_config.exportConfig(human, True, options)
@@ -96,7 +97,7 @@ def exportMhx(human, filename, options):
 #
 
 def exportMhx_25(human, config, fp):
-    gui3d.app.progress(0, text="Exporting MHX")
+    G.app.progress(0, text="Exporting MHX")
     config.mhx25 = True
     log.message("Export MHX")
     
@@ -145,10 +146,10 @@ def exportMhx_25(human, config, fp):
             copyFile25(human, "shared/mhx/templates/panel_gizmo25.mhx", fp, None, config, proxyData)    
         """            
         
-    gui3d.app.progress(0.1, text="Exporting armature")
+    G.app.progress(0.1, text="Exporting armature")
     copyFile25(human, "shared/mhx/templates/rig-armature25.mhx", fp, None, config, proxyData)    
     
-    gui3d.app.progress(0.15, text="Exporting materials")    
+    G.app.progress(0.15, text="Exporting materials")    
     fp.write("\nNoScale False ;\n\n")
     if human.uvset:
         writeMultiMaterials(human.uvset, human, config, fp)
@@ -158,7 +159,7 @@ def exportMhx_25(human, config, fp):
     if config.cage:
         proxyCopy('Cage', human, config, proxyData, fp, 0.2, 0.25)
     
-    gui3d.app.progress(0.25, text="Exporting main mesh")    
+    G.app.progress(0.25, text="Exporting main mesh")    
     if config.mainmesh:
         fp.write("#if toggle&T_Mesh\n")
         copyFile25(human, "shared/mhx/templates/meshes25.mhx", fp, None, config, proxyData)    
@@ -172,7 +173,7 @@ def exportMhx_25(human, config, fp):
     if config.rigtype == 'rigify':
         fp.write("Rigify %s ;\n" % the.Human)
 
-    gui3d.app.progress(1.0)
+    G.app.progress(1.0)
     return
 
 #
@@ -203,7 +204,7 @@ def proxyCopy(type, human, config, proxyData, fp, t0, t1):
     t = t0
     for proxy in proxyData.values():
         if proxy.type == type:
-            gui3d.app.progress(t, text="Exporting %s" % proxy.name)
+            G.app.progress(t, text="Exporting %s" % proxy.name)
             fp.write("#if toggle&T_%s\n" % proxy.type)
             copyFile25(human, "shared/mhx/templates/proxy25.mhx", fp, proxy, config, proxyData)    
             fp.write("#endif\n")
@@ -888,7 +889,7 @@ def writeProxyMaterial(fp, mat, proxy, config, proxyData):
     transparency = None
     if proxy.texture:
         uuid = proxy.getUuid()
-        human = gui3d.app.selectedHuman
+        human = G.app.selectedHuman
         if uuid in human.clothesObjs.keys() and human.clothesObjs[uuid]:
             # Apply custom texture
             clothesObj = human.clothesObjs[uuid]